@@ -1,10 +1,27 @@
+import argparse
 import asyncio
-from db_connector import create_embedding_table, install_vector_extension, create_index
+from db_connector import (
+    EMBEDDING_DIMENSIONS, create_embedding_table, install_vector_extension, create_index, create_compact_index
+)
 
-async def install_estension_and_generate_table():  
+async def install_estension_and_generate_table(method: str = "diskann", rebuild: bool = False,
+                                               compact: str = None, dimensions: int = EMBEDDING_DIMENSIONS):  
     # install_vector_extension()
     # create_embedding_table()
-    create_index()
+    if compact:
+        create_compact_index(precision=compact, dimensions=dimensions, rebuild=rebuild)
+    else:
+        create_index(method=method, rebuild=rebuild)
 
 if __name__ == "__main__":
-    asyncio.run(install_estension_and_generate_table())
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Create the ANN index on the embeddings table.")
+    parser.add_argument("--method", choices=["diskann", "hnsw"], default="diskann",
+                        help="Index type to build.")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="Replace an existing index, e.g. after changing build parameters.")
+    parser.add_argument("--compact", choices=["halfvec", "binary"],
+                        help="Build a reduced-precision hnsw index instead, for get_top_k_similar_docs_compact.")
+    parser.add_argument("--dimensions", type=int, default=EMBEDDING_DIMENSIONS,
+                        help="Leading embedding dimensions kept in the compact index.")
+    args = parser.parse_args()
+    asyncio.run(install_estension_and_generate_table(args.method, args.rebuild, args.compact, args.dimensions))
\ No newline at end of file
@@ -1,12 +1,26 @@
+import asyncio
+import hashlib
+import io
+import json
 import os
+import struct
+import threading
+import time
+from contextlib import contextmanager
+from itertools import islice
 from dotenv import load_dotenv
 import psycopg2
+from psycopg2.extensions import STATUS_READY, connection as pg_connection
 from psycopg2.extras import execute_values
+from psycopg2.pool import PoolError, ThreadedConnectionPool
 from pgvector.psycopg2 import register_vector
+import asyncpg
+from pgvector.asyncpg import register_vector as register_vector_async
 from psycopg2 import OperationalError
 from psycopg2.extras import Json
 import numpy as np
 from colorama import Fore, Style
+from ingestion.embedding_batch import EmbeddingBatch
 
 
 load_dotenv()
@@ -16,6 +30,12 @@ POSTGRES_PASSWORD = os.getenv('POSTGRES_PASSWORD')
 POSTGRES_PORT = os.getenv('POSTGRES_PORT')
 POSTGRES_DBNAME = os.getenv('POSTGRES_DBNAME')
 POSTGRES_USERNAME = os.getenv('POSTGRES_USERNAME')
+POSTGRES_POOL_MIN = int(os.getenv('POSTGRES_POOL_MIN', 1))
+POSTGRES_POOL_MAX = int(os.getenv('POSTGRES_POOL_MAX', 10))
+# Seconds to wait for a free pooled connection before giving up.
+POSTGRES_POOL_TIMEOUT = float(os.getenv('POSTGRES_POOL_TIMEOUT', 30))
+# Pooled connections idle for longer than this many seconds are pinged before reuse.
+POSTGRES_POOL_HEALTH_CHECK_INTERVAL = float(os.getenv('POSTGRES_POOL_HEALTH_CHECK_INTERVAL', 30))
 
 def connect_pg():
     connect = psycopg2.connect(
@@ -28,6 +48,153 @@ def connect_pg():
     )
     return connect
 
+class PooledConnection(pg_connection):
+    """
+    Connection class used by the pool, tracking per-connection pool state.
+    """
+    vector_registered = False
+    last_used = 0.0
+
+
+_pool = None
+_pool_slots = threading.BoundedSemaphore(POSTGRES_POOL_MAX)
+_pool_lock = threading.Lock()
+
+def get_pool() -> ThreadedConnectionPool:
+    """
+    Returns the process-wide connection pool, creating it on first use from the
+    POSTGRES_* environment settings.
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadedConnectionPool(
+                    POSTGRES_POOL_MIN,
+                    POSTGRES_POOL_MAX,
+                    host=POSTGRES_HOST,
+                    port=POSTGRES_PORT,
+                    dbname=POSTGRES_DBNAME,
+                    user=POSTGRES_USERNAME,
+                    password=POSTGRES_PASSWORD,
+                    client_encoding='UTF8',
+                    connection_factory=PooledConnection,
+                )
+    return _pool
+
+def close_pool():
+    """
+    Closes every connection of the pool. The next checkout creates a new pool.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+
+_async_pool = None
+_async_pool_lock = None
+
+async def get_async_pool() -> asyncpg.Pool:
+    """
+    Returns the asyncpg connection pool used by the async query path, creating it on
+    first use. pgvector types are registered on every connection the pool opens.
+
+    The pool belongs to the event loop that created it; call aclose_async_pool before
+    that loop ends.
+    """
+    global _async_pool, _async_pool_lock
+    if _async_pool_lock is None:
+        _async_pool_lock = asyncio.Lock()
+    async with _async_pool_lock:
+        if _async_pool is None:
+            _async_pool = await asyncpg.create_pool(
+                host=POSTGRES_HOST,
+                port=POSTGRES_PORT,
+                database=POSTGRES_DBNAME,
+                user=POSTGRES_USERNAME,
+                password=POSTGRES_PASSWORD,
+                min_size=POSTGRES_POOL_MIN,
+                max_size=POSTGRES_POOL_MAX,
+                timeout=POSTGRES_POOL_TIMEOUT,
+                init=register_vector_async,
+            )
+    return _async_pool
+
+async def aclose_async_pool():
+    """
+    Closes the asyncpg pool. The next get_async_pool call creates a new one.
+    """
+    global _async_pool, _async_pool_lock
+    if _async_pool is not None:
+        await _async_pool.close()
+        _async_pool = None
+    _async_pool_lock = None
+
+def _is_healthy(conn) -> bool:
+    if conn.closed:
+        return False
+    # New connections, and connections used a moment ago, need no round trip.
+    if not conn.last_used or time.monotonic() - conn.last_used < POSTGRES_POOL_HEALTH_CHECK_INTERVAL:
+        return True
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT 1")
+        conn.rollback()
+        return True
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        return False
+
+@contextmanager
+def pooled_connection(vector: bool = True):
+    """
+    Checks a connection out of the pool and returns it when the block exits.
+
+    Connections idle for a while are health-checked before being handed out and
+    replaced if they are broken. pgvector types are registered once per pooled
+    connection. Uncommitted work is rolled back on return, and connections that
+    broke while in use are discarded instead of going back to the pool.
+
+    Args:
+        vector (bool, optional): Register the pgvector types on the connection. Must be
+                                 False before the vector extension is installed. Defaults to True.
+
+    Yields:
+        connection: A live database connection.
+
+    Raises:
+        PoolError: If no connection became free within POSTGRES_POOL_TIMEOUT.
+    """
+    if not _pool_slots.acquire(timeout=POSTGRES_POOL_TIMEOUT):
+        raise PoolError("Timed out waiting for a pooled database connection.")
+    pool = None
+    conn = None
+    try:
+        pool = get_pool()
+        conn = pool.getconn()
+        for _ in range(POSTGRES_POOL_MAX):
+            if _is_healthy(conn):
+                break
+            pool.putconn(conn, close=True)
+            conn = pool.getconn()
+        if vector and not conn.vector_registered:
+            register_vector(conn)
+            # Registration looks the types up in a query; end its transaction so callers
+            # can still switch the connection to autocommit.
+            conn.rollback()
+            conn.vector_registered = True
+        yield conn
+    finally:
+        if conn is not None:
+            if not conn.closed and conn.status != STATUS_READY:
+                try:
+                    conn.rollback()
+                except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                    conn.close()
+            conn.last_used = time.monotonic()
+            pool.putconn(conn, close=bool(conn.closed))
+        _pool_slots.release()
+
 def check_db_connection():
     """
     Attempts to establish a connection to a PostgreSQL database.
@@ -38,126 +205,1295 @@ def check_db_connection():
     Returns:
         bool: True if the connection is successful, False otherwise.
     """
-    conn = None
     try:
-        conn = connect_pg()
+        with pooled_connection(vector=False) as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
         print("Connection to the PostgreSQL database successful!")
         return True
     except OperationalError as e:
         print(Fore.RED+ f"The connection to the database failed.\nError: {e}")
         print(Style.RESET_ALL)
         return False
-    finally:
-        if conn:
-            conn.close()
 
 def install_vector_extension():
     try:
-        conn = connect_pg()
-        cursor = conn.cursor()
+        with pooled_connection(vector=False) as conn:
+            cursor = conn.cursor()
 
-        #install pgvector
-        cursor.execute("CREATE EXTENSION IF NOT EXISTS vector;")
-        conn.commit()
+            #install pgvector
+            cursor.execute("CREATE EXTENSION IF NOT EXISTS vector;")
+            conn.commit()
 
-        #install pgvectorscale
-        cursor.execute("CREATE EXTENSION IF NOT EXISTS vectorscale CASCADE;")
-        conn.commit()
+            #install pgvectorscale
+            cursor.execute("CREATE EXTENSION IF NOT EXISTS vectorscale CASCADE;")
+            conn.commit()
+
+            #install pg_prewarm, used by prewarm_index
+            cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_prewarm;")
+            conn.commit()
     except psycopg2.Error as e:
-        if conn:
-            conn.rollback()
         print(f"Database error occurred: {e}")
 
-def create_index():
+# Operator class of each supported ANN index method; embeddings are compared by cosine distance.
+INDEX_OPERATOR_CLASSES = {
+    "diskann": "vector_cosine_ops",
+    "hnsw": "vector_cosine_ops",
+}
+DEFAULT_INDEX_PARAMS = {
+    "diskann": {"num_neighbors": 50, "search_list_size": 100},
+    "hnsw": {"m": 16, "ef_construction": 64},
+}
+# Query-time knobs accepted in search_params, and the setting each one controls.
+SEARCH_SETTINGS = {
+    "search_list_size": "diskann.query_search_list_size",
+    "rescore": "diskann.query_rescore",
+    "ef_search": "hnsw.ef_search",
+    "iterative_scan": "hnsw.iterative_scan",
+}
+DEFAULT_SEARCH_PARAMS = {
+    name: os.getenv(env_var)
+    for name, env_var in (
+        ("search_list_size", "VECTOR_SEARCH_LIST_SIZE"),
+        ("rescore", "VECTOR_QUERY_RESCORE"),
+        ("ef_search", "VECTOR_EF_SEARCH"),
+    )
+    if os.getenv(env_var)
+}
+
+# Text search configuration of text_search_column; 'simple' keeps identifiers unstemmed.
+TEXT_SEARCH_CONFIG = os.getenv('TEXT_SEARCH_CONFIG', 'english')
+# Reciprocal rank fusion constant: higher values flatten the gap between top ranks.
+RRF_K = 60
+
+def _text_search_config() -> str:
+    if not TEXT_SEARCH_CONFIG.isidentifier():
+        raise ValueError(f"Invalid text search configuration: {TEXT_SEARCH_CONFIG}")
+    return f"'{TEXT_SEARCH_CONFIG}'::regconfig"
+
+def _index_is_valid(cursor, index_name):
+    """
+    Returns True if the index exists and is usable, False if a failed concurrent build
+    left it invalid, and None if it does not exist.
+    """
+    cursor.execute(
+        "SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid WHERE c.relname = %s",
+        (index_name,),
+    )
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+def create_index(
+    table_name: str = "embeddings_table",
+    method: str = "diskann",
+    params: dict = None,
+    index_name: str = "embedding_idx",
+    concurrently: bool = True,
+    rebuild: bool = False,
+):
+    """
+    Creates, or rebuilds, the ANN index on the embedding column.
+
+    Build after bulk loading the table: building once over the loaded rows is much
+    faster than maintaining the index on every insert. With concurrently=True the
+    table stays writable while the index builds. Invalid indexes left behind by an
+    interrupted concurrent build are dropped and built again.
+
+    A rebuild creates the new index next to the old one and swaps them, so queries
+    keep an index to use throughout.
+
+    Args:
+        table_name (str, optional): Table holding the embeddings. Defaults to "embeddings_table".
+        method (str, optional): "diskann" (pgvectorscale) or "hnsw" (pgvector). Defaults to "diskann".
+        params (dict, optional): Build parameters, e.g. {'num_neighbors': 50} for diskann or
+                                 {'m': 16, 'ef_construction': 64} for hnsw. Merged over
+                                 DEFAULT_INDEX_PARAMS. Defaults to None.
+        index_name (str, optional): Name of the index. Defaults to "embedding_idx".
+        concurrently (bool, optional): Build without blocking writes to the table. Defaults to True.
+        rebuild (bool, optional): Replace the index if it already exists, e.g. to apply new
+                                  build parameters. Defaults to False.
+
+    Raises:
+        ValueError: If method or a parameter name is not supported.
+    """
+    if method not in INDEX_OPERATOR_CLASSES:
+        raise ValueError(f"Unsupported index method: {method}")
+    _build_index(table_name, index_name, method, f"embedding_column {INDEX_OPERATOR_CLASSES[method]}",
+                 params, concurrently, rebuild)
+
+def _build_index(table_name, index_name, method, key, params, concurrently, rebuild):
+    """
+    Builds an ANN index on the key (column or expression, with its operator class),
+    as described in create_index.
+    """
+    params = {**DEFAULT_INDEX_PARAMS[method], **(params or {})}
+    for name in params:
+        if not name.isidentifier():
+            raise ValueError(f"Invalid index parameter: {name}")
+
+    with_clause = ""
+    if params:
+        with_clause = " WITH (" + ", ".join(f"{name} = %s" for name in params) + ")"
+    concurrent = " CONCURRENTLY" if concurrently else ""
+    build_name = f"{index_name}_new" if rebuild else index_name
+
     try:
-        conn = connect_pg()
-        cursor = conn.cursor()
+        with pooled_connection(vector=False) as conn:
+            # CREATE INDEX CONCURRENTLY cannot run inside a transaction block.
+            conn.autocommit = True
+            try:
+                with conn.cursor() as cursor:
+                    if rebuild or _index_is_valid(cursor, build_name) is False:
+                        cursor.execute(f"DROP INDEX{concurrent} IF EXISTS {build_name}")
+                    cursor.execute(
+                        f"CREATE INDEX{concurrent} IF NOT EXISTS {build_name} ON {table_name} "
+                        f"USING {method} ({key}){with_clause}",
+                        list(params.values()),
+                    )
+                    if rebuild:
+                        cursor.execute(f"DROP INDEX{concurrent} IF EXISTS {index_name}")
+                        cursor.execute(f"ALTER INDEX {build_name} RENAME TO {index_name}")
+            finally:
+                conn.autocommit = False
+        print(f"Index {index_name} ({method}) is ready on {table_name}.")
+    except psycopg2.Error as e:
+        print(f"Database error occurred: {e}")
 
-        cursor.execute('CREATE INDEX embedding_idx ON embeddings_table USING diskann (embedding_column);')
-        conn.commit()
+# Dimensions of embedding_column.
+EMBEDDING_DIMENSIONS = 768
+# Operator class and distance operator of each compact index precision.
+COMPACT_PRECISIONS = {
+    "halfvec": ("halfvec_cosine_ops", "<=>"),
+    "binary": ("bit_hamming_ops", "<~>"),
+}
+# Opt-in compact retrieval, e.g. COMPACT_INDEX_PRECISION=binary; unset searches embedding_column directly.
+COMPACT_INDEX_PRECISION = os.getenv('COMPACT_INDEX_PRECISION')
+COMPACT_INDEX_DIMENSIONS = int(os.getenv('COMPACT_INDEX_DIMENSIONS', EMBEDDING_DIMENSIONS))
+
+def _compact_expression(vector: str, precision: str, dimensions: int) -> str:
+    """
+    Returns the SQL expression reducing a full-precision vector to its compact form:
+    its first dimensions (nomic-embed-text is trained with Matryoshka representation
+    learning, so a prefix remains a usable embedding), as half floats or as bits.
+    """
+    if precision not in COMPACT_PRECISIONS:
+        raise ValueError(f"Unsupported compact precision: {precision}")
+    dimensions = int(dimensions)
+    if not 0 < dimensions <= EMBEDDING_DIMENSIONS:
+        raise ValueError(f"Compact dimensions must be between 1 and {EMBEDDING_DIMENSIONS}")
+
+    if dimensions < EMBEDDING_DIMENSIONS:
+        vector = f"subvector({vector}, 1, {dimensions})"
+    if precision == "binary":
+        return f"binary_quantize({vector})::bit({dimensions})"
+    if dimensions < EMBEDDING_DIMENSIONS:
+        vector = f"l2_normalize({vector})"
+    return f"({vector})::halfvec({dimensions})"
+
+def compact_index_name(precision: str = COMPACT_INDEX_PRECISION or "halfvec",
+                       dimensions: int = COMPACT_INDEX_DIMENSIONS, table_name: str = "embeddings_table") -> str:
+    """
+    Returns the name of the compact index create_compact_index builds for these settings.
+    """
+    return f"{table_name}_{precision}_{dimensions}_idx"
+
+def create_compact_index(
+    table_name: str = "embeddings_table",
+    precision: str = COMPACT_INDEX_PRECISION or "halfvec",
+    dimensions: int = COMPACT_INDEX_DIMENSIONS,
+    params: dict = None,
+    concurrently: bool = True,
+    rebuild: bool = False,
+):
+    """
+    Creates an hnsw expression index over reduced-precision embeddings.
+
+    The table keeps the full-precision vectors, only the index is compact: 768
+    dimensions take 3 KB per row as vector, 1.5 KB as halfvec and 96 bytes as bits, and
+    truncating to fewer dimensions shrinks it further. Query it with
+    get_top_k_similar_docs_compact, which re-scores the candidates exactly.
+
+    Args:
+        table_name (str, optional): Table holding the embeddings. Defaults to "embeddings_table".
+        precision (str, optional): "halfvec" (16-bit floats) or "binary" (1 bit per dimension).
+                                   Defaults to COMPACT_INDEX_PRECISION, or "halfvec".
+        dimensions (int, optional): Number of leading dimensions indexed. Defaults to
+                                    COMPACT_INDEX_DIMENSIONS (768).
+        params (dict, optional): hnsw build parameters, as in create_index. Defaults to None.
+        concurrently (bool, optional): Build without blocking writes to the table. Defaults to True.
+        rebuild (bool, optional): Replace the index if it already exists. Defaults to False.
+    """
+    expression = _compact_expression("embedding_column", precision, dimensions)
+    operator_class, _ = COMPACT_PRECISIONS[precision]
+    _build_index(table_name, compact_index_name(precision, dimensions, table_name), "hnsw",
+                 f"({expression}) {operator_class}", params, concurrently, rebuild)
+
+def prewarm_index(index_name: str = "embedding_idx") -> int:
+    """
+    Loads an index into shared buffers with pg_prewarm, so the first queries after a
+    restart do not pay for reading it from disk. The pg_prewarm extension is installed
+    by install_vector_extension; without it nothing is loaded.
+
+    Returns:
+        int: The number of blocks loaded, or 0 if prewarming failed.
+    """
+    try:
+        with pooled_connection(vector=False) as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_prewarm'")
+                if cursor.fetchone() is None:
+                    print(f"pg_prewarm is not installed, {index_name} was not prewarmed.")
+                    return 0
+                cursor.execute("SELECT pg_prewarm(%s::regclass)", (index_name,))
+                blocks = cursor.fetchone()[0]
+        print(f"Prewarmed {blocks} blocks of {index_name}.")
+        return blocks
     except psycopg2.Error as e:
-        if conn:
-            conn.rollback()
         print(f"Database error occurred: {e}")
+        return 0
+
+def _search_settings(search_params) -> list:
+    """
+    Returns (setting, value) pairs for the query-time knobs in search_params, with
+    DEFAULT_SEARCH_PARAMS applied for the knobs not given.
+    """
+    params = {**DEFAULT_SEARCH_PARAMS, **(search_params or {})}
+    unknown = set(params) - set(SEARCH_SETTINGS)
+    if unknown:
+        raise ValueError(f"Unsupported search parameters: {', '.join(sorted(unknown))}")
+    return [(SEARCH_SETTINGS[name], str(value).lower()) for name, value in params.items()]
+
+def _apply_search_settings(cursor, search_params):
+    # Applied with is_local, so they reset when the current transaction ends
+    for setting, value in _search_settings(search_params):
+        cursor.execute("SELECT set_config(%s, %s, true)", (setting, value))
+
+def _fetch_texts(sql: str, args, search_params) -> list:
+    """
+    Runs a retrieval query returning text_column first, with the search_params knobs
+    applied to its transaction.
+
+    Returns:
+        list[str]: The first column of every row, or [] if the query failed.
+    """
+    try:
+        # pgvector is registered once per pooled connection
+        with pooled_connection() as conn:
+            with conn.cursor() as cur:
+                _apply_search_settings(cur, search_params)
+                cur.execute(sql, args)
+                return [row[0] for row in cur.fetchall()]
+    except psycopg2.Error as e:
+        print(f"Database error occurred: {e}")
+        return []
+
+async def _afetch_texts(sql: str, args, search_params) -> list:
+    """
+    Async version of _fetch_texts, served from the asyncpg pool. sql must use
+    numeric ($1) placeholders.
+    """
+    try:
+        pool = await get_async_pool()
+        async with pool.acquire() as conn:
+            async with conn.transaction():
+                for setting, value in _search_settings(search_params):
+                    await conn.execute("SELECT set_config($1, $2, true)", setting, value)
+                rows = await conn.fetch(sql, *args)
+        return [row[0] for row in rows]
+    except (asyncpg.PostgresError, OSError, asyncio.TimeoutError) as e:
+        print(f"Database error occurred: {e}")
+        return []
 
 def create_embedding_table():
     try:
-        conn = connect_pg()
-        cursor = conn.cursor()
-
-        # Create table to store embeddings and metadata
-        table_create_command = """
-            CREATE TABLE embeddings_table (
-                id SERIAL PRIMARY KEY,
-                text_column TEXT,
-                doc_name_column VARCHAR(255),
-                doc_index_column INTEGER,
-                embedding_column VECTOR(768)
-            );
-        """
-
-        cursor.execute(table_create_command)
-        cursor.close()
-        conn.commit()
+        with pooled_connection() as conn:
+            cursor = conn.cursor()
+
+            # Create table to store embeddings and metadata
+            table_create_command = """
+                CREATE TABLE embeddings_table (
+                    id SERIAL PRIMARY KEY,
+                    text_column TEXT,
+                    doc_name_column VARCHAR(255),
+                    doc_index_column INTEGER,
+                    embedding_column VECTOR(768),
+                    source_type_column VARCHAR(32),
+                    collection_column VARCHAR(255),
+                    ingested_at_column TIMESTAMPTZ NOT NULL DEFAULT now(),
+                    content_hash_column VARCHAR(32),
+                    metadata_column JSONB
+                );
+            """
+
+            cursor.execute(table_create_command)
+            cursor.close()
+            conn.commit()
     except psycopg2.Error as e:
-        if conn:
-            conn.rollback()
         print(f"Database error occurred: {e}")
+    ensure_embedding_schema()
+
+def ensure_embedding_schema(table_name: str = "embeddings_table"):
+    """
+    Brings an existing embeddings table up to date with the columns, indexes and
+    checkpoint tables the ingestion and retrieval functions rely on. Safe to run
+    repeatedly.
+    """
+    ensure_metadata_columns(table_name)
+    ensure_text_search_column(table_name)
+    ensure_checkpoint_schema(table_name)
+    ensure_duplicates_table()
 
-def insert_embeddings_to_db(data, table_name="embeddings_table"):
+def ensure_metadata_columns(table_name: str = "embeddings_table"):
+    """
+    Adds the columns used by retrieval filters, if they are missing, and indexes them.
+
+    Rows inserted before ingested_at_column existed get the time of the migration.
+    """
     try:
-        conn = connect_pg()
-        cursor = conn.cursor()
+        with pooled_connection(vector=False) as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(f"""
+                    ALTER TABLE {table_name}
+                    ADD COLUMN IF NOT EXISTS source_type_column VARCHAR(32),
+                    ADD COLUMN IF NOT EXISTS collection_column VARCHAR(255),
+                    ADD COLUMN IF NOT EXISTS ingested_at_column TIMESTAMPTZ NOT NULL DEFAULT now(),
+                    ADD COLUMN IF NOT EXISTS metadata_column JSONB
+                """)
+                cursor.execute(f"CREATE INDEX IF NOT EXISTS {table_name}_doc_name_idx ON {table_name} (doc_name_column)")
+                cursor.execute(f"""
+                    CREATE INDEX IF NOT EXISTS {table_name}_source_idx
+                    ON {table_name} (source_type_column, collection_column, ingested_at_column)
+                """)
+            conn.commit()
+    except psycopg2.Error as e:
+        print(f"Database error occurred: {e}")
+
+# Columns an embeddings table can be partitioned by.
+PARTITION_COLUMNS = {
+    "source_type": "source_type_column",
+    "collection": "collection_column",
+}
 
-        sql = f"""
-        INSERT INTO {table_name} (text_column, doc_name_column, doc_index_column, embedding_column)
-        VALUES %s
-        """
-        
-        values = [(row['text'], row['metadata_']['doc'], row['metadata_']['index'], row['embedding']) for row in data]
-        
-        # Use execute_values for bulk insertion
-        execute_values(cursor, sql, values)
-        
+def create_partitioned_embedding_table(table_name: str = "embeddings_table", partition_by: str = "source_type",
+                                       partitions: tuple = ("document", "site")):
+    """
+    Creates the embeddings table partitioned by LIST on source type or collection.
+
+    Each partition is a small table with its own ANN index (see create_partition_indexes),
+    so queries filtered on the partition column only search the matching partitions,
+    with full recall, instead of filtering the results of one global index. Rows whose
+    value has no partition go to the default partition.
+
+    Args:
+        table_name (str, optional): Name of the table. Defaults to "embeddings_table".
+        partition_by (str, optional): "source_type" or "collection". Defaults to "source_type".
+        partitions (tuple, optional): Values that get their own partition. Defaults to
+                                      ("document", "site").
+
+    Raises:
+        ValueError: If partition_by is not supported.
+    """
+    if partition_by not in PARTITION_COLUMNS:
+        raise ValueError(f"Unsupported partition column: {partition_by}")
+
+    try:
+        with pooled_connection() as conn:
+            with conn.cursor() as cursor:
+                # No primary key: it would have to include the partition column, which may be NULL.
+                cursor.execute(f"""
+                    CREATE TABLE IF NOT EXISTS {table_name} (
+                        id BIGSERIAL,
+                        text_column TEXT,
+                        doc_name_column VARCHAR(255),
+                        doc_index_column INTEGER,
+                        embedding_column VECTOR(768),
+                        source_type_column VARCHAR(32),
+                        collection_column VARCHAR(255),
+                        ingested_at_column TIMESTAMPTZ NOT NULL DEFAULT now(),
+                        content_hash_column VARCHAR(32),
+                        metadata_column JSONB
+                    ) PARTITION BY LIST ({PARTITION_COLUMNS[partition_by]})
+                """)
+                cursor.execute(f"CREATE TABLE IF NOT EXISTS {table_name}_default PARTITION OF {table_name} DEFAULT")
+            conn.commit()
+    except psycopg2.Error as e:
+        print(f"Database error occurred: {e}")
+        return
+
+    for value in partitions:
+        add_embedding_partition(value, table_name)
+    ensure_embedding_schema(table_name)
+
+def _partition_name(table_name: str, value: str) -> str:
+    return f"{table_name}_" + "".join(c if c.isalnum() else "_" for c in value.lower())
+
+def add_embedding_partition(value: str, table_name: str = "embeddings_table") -> str:
+    """
+    Adds a partition for one source type or collection to a partitioned embeddings table.
+
+    Create the partition before loading its rows: rows already in the default
+    partition with this value make the statement fail.
+
+    Returns:
+        str: The name of the partition.
+    """
+    partition = _partition_name(table_name, value)
+    try:
+        with pooled_connection(vector=False) as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    f"CREATE TABLE IF NOT EXISTS {partition} PARTITION OF {table_name} FOR VALUES IN (%s)",
+                    (value,),
+                )
+            conn.commit()
+    except psycopg2.Error as e:
+        print(f"Database error occurred: {e}")
+    return partition
+
+def create_partition_indexes(table_name: str = "embeddings_table", method: str = "diskann", params: dict = None,
+                             rebuild: bool = False):
+    """
+    Builds an ANN index on every partition of a partitioned embeddings table, after the
+    partitions are loaded. Arguments are as in create_index.
+    """
+    try:
+        with pooled_connection(vector=False) as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    "SELECT inhrelid::regclass::text FROM pg_inherits WHERE inhparent = %s::regclass",
+                    (table_name,),
+                )
+                partitions = [row[0] for row in cursor.fetchall()]
+    except psycopg2.Error as e:
+        print(f"Database error occurred: {e}")
+        return
+
+    for partition in partitions:
+        create_index(partition, method=method, params=params, index_name=f"{partition}_embedding_idx", rebuild=rebuild)
+
+def ensure_text_search_column(table_name: str = "embeddings_table"):
+    """
+    Adds the full-text search column used by hybrid retrieval, if it is missing.
+
+    text_search_column is a stored generated tsvector of text_column, so PostgreSQL
+    keeps it up to date on every insert and update, and it is GIN indexed.
+    Adding it to an existing table rewrites the table once.
+    """
+    try:
+        with pooled_connection(vector=False) as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(f"""
+                    ALTER TABLE {table_name}
+                    ADD COLUMN IF NOT EXISTS text_search_column tsvector
+                    GENERATED ALWAYS AS (to_tsvector({_text_search_config()}, coalesce(text_column, ''))) STORED
+                """)
+                cursor.execute(f"""
+                    CREATE INDEX IF NOT EXISTS {table_name}_text_search_idx
+                    ON {table_name} USING gin (text_search_column)
+                """)
+            conn.commit()
+    except psycopg2.Error as e:
+        print(f"Database error occurred: {e}")
+
+def content_hash(text: str) -> str:
+    """
+    Returns the hash of a chunk text stored in content_hash_column. It is the MD5 hex
+    digest, which PostgreSQL's md5() computes too, so existing rows can be backfilled.
+    """
+    return hashlib.md5(text.encode("utf-8"), usedforsecurity=False).hexdigest()
+
+def ensure_checkpoint_schema(table_name: str = "embeddings_table"):
+    """
+    Sets up checkpointed ingestion: content_hash_column, the ingestion_runs and
+    ingestion_progress tables, and a unique index on (doc_name_column,
+    doc_index_column, content_hash_column) which makes every insert an idempotent upsert.
+
+    Tables filled before ingestion was idempotent can hold the same chunk several
+    times; the extra copies are deleted, keeping the oldest row, before the unique
+    index is created. On a partitioned table the partition column is added to the
+    unique key, as PostgreSQL requires, and as it may be NULL the key then treats
+    NULLs as equal (PostgreSQL 15 or later), so chunks without a collection still conflict.
+
+    Raises:
+        psycopg2.Error: If the schema could not be set up. Ingestion must not run then,
+                        since every insert writes content_hash_column.
+    """
+    with pooled_connection(vector=False) as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT 1 FROM pg_attribute
+                WHERE attrelid = %s::regclass AND attname = 'content_hash_column' AND NOT attisdropped
+            """, (table_name,))
+            if cursor.fetchone() is None:
+                cursor.execute(f"ALTER TABLE {table_name} ADD COLUMN content_hash_column VARCHAR(32)")
+                cursor.execute(f"UPDATE {table_name} SET content_hash_column = md5(text_column)")
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS ingestion_runs (
+                    run_id SERIAL PRIMARY KEY,
+                    table_name VARCHAR(255) NOT NULL,
+                    status VARCHAR(16) NOT NULL DEFAULT 'running',
+                    started_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+                    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+                )
+            """)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS ingestion_progress (
+                    run_id INTEGER NOT NULL REFERENCES ingestion_runs (run_id) ON DELETE CASCADE,
+                    doc_name VARCHAR(255) NOT NULL,
+                    doc_index INTEGER NOT NULL,
+                    content_hash VARCHAR(32) NOT NULL,
+                    persisted_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+                    PRIMARY KEY (run_id, doc_name, doc_index, content_hash)
+                )
+            """)
+        conn.commit()
+
+        # Deduplicate and index in a transaction of their own, so the column and the
+        # checkpoint tables stay in place if this part fails.
+        with conn.cursor() as cursor:
+            if _index_is_valid(cursor, f"{table_name}_chunk_key_idx") is not None:
+                return
+            cursor.execute("""
+                SELECT a.attname, a.attnotnull
+                FROM pg_partitioned_table p
+                JOIN pg_attribute a ON a.attrelid = p.partrelid AND a.attnum = ANY(p.partattrs::int2[])
+                WHERE p.partrelid = %s::regclass
+            """, (table_name,))
+            key = ["doc_name_column", "doc_index_column", "content_hash_column"]
+            nullable_key = False
+            for column, not_null in cursor.fetchall():
+                if column not in key:
+                    key.append(column)
+                    nullable_key = nullable_key or not not_null
+
+            # A window over the key finds the extra copies in one sort, where a self-join
+            # on IS NOT DISTINCT FROM could only run as a nested loop.
+            cursor.execute(f"""
+                DELETE FROM {table_name} t
+                USING (
+                    SELECT id, row_number() OVER (PARTITION BY {", ".join(key)} ORDER BY id) AS copy_no
+                    FROM {table_name}
+                ) copies
+                WHERE t.id = copies.id AND copies.copy_no > 1
+            """)
+            if cursor.rowcount:
+                print(f"Deleted {cursor.rowcount} duplicate chunks from {table_name}.")
+
+            nulls = ""
+            if nullable_key:
+                if conn.server_version >= 150000:
+                    nulls = " NULLS NOT DISTINCT"
+                else:
+                    print(f"PostgreSQL 15 or later is required for rows of {table_name} without a "
+                          f"{key[-1]} value to be deduplicated on insert.")
+            cursor.execute(f"""
+                CREATE UNIQUE INDEX {table_name}_chunk_key_idx
+                ON {table_name} ({", ".join(key)}){nulls}
+            """)
+        conn.commit()
+
+def start_ingestion_run(table_name: str = "embeddings_table", resume: bool = False) -> int:
+    """
+    Registers an ingestion run and returns its id.
+
+    With resume=True the most recent unfinished run into table_name is continued
+    instead, if there is one.
+    """
+    with pooled_connection(vector=False) as conn:
+        with conn.cursor() as cursor:
+            run_id = None
+            resumed = False
+            if resume:
+                cursor.execute("""
+                    SELECT run_id FROM ingestion_runs
+                    WHERE table_name = %s AND status <> 'completed'
+                    ORDER BY run_id DESC LIMIT 1
+                """, (table_name,))
+                row = cursor.fetchone()
+                if row:
+                    run_id, resumed = row[0], True
+                    cursor.execute(
+                        "UPDATE ingestion_runs SET status = 'running', updated_at = now() WHERE run_id = %s",
+                        (run_id,),
+                    )
+            if run_id is None:
+                cursor.execute("INSERT INTO ingestion_runs (table_name) VALUES (%s) RETURNING run_id", (table_name,))
+                run_id = cursor.fetchone()[0]
         conn.commit()
-        print(f"Successfully inserted {len(values)} rows into {table_name}.")
+    print(f"{'Resuming' if resumed else 'Starting'} ingestion run {run_id}.")
+    return run_id
 
+def finish_ingestion_run(run_id: int, status: str = "completed"):
+    """
+    Marks an ingestion run as 'completed', or 'failed' so that a resumed run picks it up.
+    """
+    try:
+        with pooled_connection(vector=False) as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    "UPDATE ingestion_runs SET status = %s, updated_at = now() WHERE run_id = %s",
+                    (status, run_id),
+                )
+            conn.commit()
     except psycopg2.Error as e:
-        if conn:
-            conn.rollback()
         print(f"Database error occurred: {e}")
 
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
-        print("Database connection closed.")
+def get_run_progress(run_id: int) -> set:
+    """
+    Returns the (doc_name, doc_index, content_hash) keys of the chunks an ingestion run
+    has persisted, so resuming it can skip embedding them again.
+    """
+    with pooled_connection(vector=False) as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "SELECT doc_name, doc_index, content_hash FROM ingestion_progress WHERE run_id = %s",
+                (run_id,),
+            )
+            return set(cursor.fetchall())
+
+def _record_progress(cursor, run_id, rows):
+    # Written in the same transaction as the rows, so the checkpoint never runs ahead of the data.
+    execute_values(
+        cursor,
+        "INSERT INTO ingestion_progress (run_id, doc_name, doc_index, content_hash) VALUES %s ON CONFLICT DO NOTHING",
+        [(run_id, row[1], row[2], row[6]) for row in rows],
+    )
+
+# Columns written by the insert functions, in the order of the rows of _iter_embedding_rows.
+# ingested_at_column is left to its default.
+_INSERT_COLUMNS = ("text_column, doc_name_column, doc_index_column, embedding_column, "
+                   "source_type_column, collection_column, content_hash_column, metadata_column")
+# Chunk metadata keys stored in their own columns rather than in metadata_column.
+_METADATA_COLUMN_KEYS = ('doc', 'index', 'source_type', 'collection')
+
+def _embedding_row(text, doc_name, doc_index, embedding, metadata):
+    # The remaining chunk metadata (page, character offsets, headings...) goes to metadata_column.
+    extra = {key: value for key, value in metadata.items() if key not in _METADATA_COLUMN_KEYS}
+    return (text, doc_name, doc_index, embedding, metadata.get('source_type'), metadata.get('collection'),
+            content_hash(text), Json(extra))
+
+def _iter_embedding_rows(data):
+    """
+    Lazily yields (text, doc_name, doc_index, embedding, source_type, collection,
+    content_hash, metadata) rows from an EmbeddingBatch, or from an iterable of
+    EmbeddingBatch objects and/or chunk dicts.
+    """
+    batches = [data] if isinstance(data, EmbeddingBatch) else data
+    for item in batches:
+        if isinstance(item, EmbeddingBatch):
+            for (text, doc_name, doc_index, embedding), metadata in zip(item.rows(), item.metadata):
+                yield _embedding_row(text, doc_name, doc_index, embedding, metadata)
+        else:
+            metadata = item['metadata_']
+            yield _embedding_row(item['text'], metadata['doc'], metadata['index'], item['embedding'], metadata)
+
+def _embedding_rows(data) -> list:
+    """
+    Returns (text, doc_name, doc_index, embedding, source_type, collection, content_hash,
+    metadata) rows from an EmbeddingBatch or a list of chunk dicts.
+    """
+    return list(_iter_embedding_rows(data))
+
+_COPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack("!ii", 0, 0)
+_COPY_TRAILER = struct.pack("!h", -1)
+_NULL_FIELD = struct.pack("!i", -1)
+
+def _encode_text(value) -> bytes:
+    if value is None:
+        return _NULL_FIELD
+    data = value.encode("utf-8")
+    return struct.pack("!i", len(data)) + data
+
+def _encode_vector(embedding) -> bytes:
+    # pgvector binary format: int16 dimensions, int16 unused, then big-endian float4 values.
+    values = np.asarray(embedding, dtype=">f4")
+    return struct.pack("!iHH", 4 + values.nbytes, len(values), 0) + values.tobytes()
+
+def _encode_jsonb(value: Json) -> bytes:
+    # jsonb binary format: a version byte, then the JSON text.
+    data = b"\x01" + json.dumps(value.adapted).encode("utf-8")
+    return struct.pack("!i", len(data)) + data
+
+def _iter_copy_data(rows):
+    """
+    Yields the COPY BINARY encoding of rows in the _INSERT_COLUMNS order.
+    """
+    yield _COPY_HEADER
+    for text, doc_name, doc_index, embedding, source_type, collection, text_hash, metadata in rows:
+        yield b"".join((
+            struct.pack("!h", 8),
+            _encode_text(text),
+            _encode_text(doc_name),
+            struct.pack("!ii", 4, doc_index),
+            _encode_vector(embedding),
+            _encode_text(source_type),
+            _encode_text(collection),
+            _encode_text(text_hash),
+            _encode_jsonb(metadata),
+        ))
+    yield _COPY_TRAILER
+
+class _IteratorStream(io.RawIOBase):
+    """
+    Read-only file object over an iterator of byte strings, so COPY data is
+    produced as the server consumes it rather than built up front.
+    """
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._buffer = memoryview(b"")
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self._buffer:
+            try:
+                self._buffer = memoryview(next(self._chunks))
+            except StopIteration:
+                return 0
+        size = min(len(buffer), len(self._buffer))
+        buffer[:size] = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        return size
+
+def copy_embeddings_to_db(data, table_name="embeddings_table", batch_size=10000, run_id: int = None) -> int:
+    """
+    Bulk loads embedded chunks with COPY ... FROM STDIN (FORMAT BINARY).
+
+    Rows are streamed from data and encoded straight to PostgreSQL's binary format,
+    vectors included, without building intermediate strings or tuples for the whole
+    input. Each batch of batch_size rows is its own COPY and is committed on its own,
+    so an interruption only loses the current batch.
+
+    Batches are copied into a temporary staging table and moved over with
+    INSERT ... ON CONFLICT DO NOTHING, so chunks already stored are skipped and
+    loading the same data twice is harmless.
+
+    Args:
+        data (EmbeddingBatch | Iterable): The embedded chunks, as an EmbeddingBatch or an
+                                          iterable (e.g. a generator) of EmbeddingBatch
+                                          objects and/or chunk dicts.
+        table_name (str, optional): Table holding the embeddings. Defaults to "embeddings_table".
+        batch_size (int, optional): Number of rows per COPY and commit. Defaults to 10000.
+        run_id (int, optional): Ingestion run to checkpoint each committed batch under,
+                                see start_ingestion_run. Defaults to None.
+
+    Returns:
+        int: The number of new rows committed.
+
+    Raises:
+        psycopg2.Error: If a batch failed. The batches before it stay committed.
+    """
+    copy_sql = f"""
+    COPY embeddings_staging ({_INSERT_COLUMNS})
+    FROM STDIN (FORMAT BINARY)
+    """
+    insert_sql = f"""
+    INSERT INTO {table_name} ({_INSERT_COLUMNS})
+    SELECT {_INSERT_COLUMNS} FROM embeddings_staging
+    ON CONFLICT DO NOTHING
+    """
+    loaded = 0
+    rows = _iter_embedding_rows(data)
+    with pooled_connection() as conn:
+        with conn.cursor() as cursor:
+            while True:
+                batch = list(islice(rows, batch_size))
+                if not batch:
+                    break
+                # Only the copied columns: a copy of the id default would draw every
+                # staged row from the real table's sequence.
+                cursor.execute(f"""
+                    CREATE TEMP TABLE embeddings_staging ON COMMIT DROP
+                    AS SELECT {_INSERT_COLUMNS} FROM {table_name} WITH NO DATA
+                """)
+                cursor.copy_expert(copy_sql, _IteratorStream(_iter_copy_data(batch)))
+                cursor.execute(insert_sql)
+                loaded += cursor.rowcount
+                if run_id is not None:
+                    _record_progress(cursor, run_id, batch)
+                conn.commit()
+                print(f"Loaded {loaded} rows into {table_name}.")
+    return loaded
+
+def insert_embeddings_to_db(data, table_name="embeddings_table", run_id: int = None):
+    """
+    Inserts embedded chunks into the embeddings table. Chunks already stored, with the
+    same document, index and content, are skipped.
+
+    Args:
+        data (EmbeddingBatch | list[dict]): The embedded chunks, as a columnar batch or in
+                                            the chunk dict format.
+        table_name (str, optional): Table holding the embeddings. Defaults to "embeddings_table".
+        run_id (int, optional): Ingestion run to checkpoint the rows under, see
+                                start_ingestion_run. Defaults to None.
+    """
+    try:
+        with pooled_connection() as conn:
+            with conn.cursor() as cursor:
+                sql = f"""
+                INSERT INTO {table_name} ({_INSERT_COLUMNS})
+                VALUES %s
+                ON CONFLICT DO NOTHING
+                """
+
+                values = _embedding_rows(data)
+
+                # Use execute_values for bulk insertion
+                execute_values(cursor, sql, values)
+                if run_id is not None:
+                    _record_progress(cursor, run_id, values)
+
+            conn.commit()
+            print(f"Successfully inserted {len(values)} rows into {table_name}.")
+
+    except psycopg2.Error as e:
+        print(f"Database error occurred: {e}")
 
-def get_top_k_similar_docs(query_embedding: list, k: int = 3) -> list:
+def replace_document_embeddings(doc_name: str, data, table_name="embeddings_table", former_names=()) -> bool:
+    """
+    Replaces all rows of a document with new chunks in a single transaction, so readers
+    never see the document half updated.
+
+    Args:
+        doc_name (str): Value of doc_name_column identifying the document.
+        data (EmbeddingBatch | list[dict]): The document chunks, as a columnar batch or in
+                                            the chunk dict format.
+        table_name (str, optional): Table holding the embeddings. Defaults to "embeddings_table".
+        former_names (Iterable[str], optional): Other doc_name_column values the document may
+                                                still be stored under, deleted in the same
+                                                transaction. Defaults to ().
+
+    Returns:
+        bool: True if the document was replaced, False if the transaction was rolled back.
+    """
+    try:
+        with pooled_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    f"DELETE FROM {table_name} WHERE doc_name_column = ANY(%s)", ([doc_name, *former_names],)
+                )
+
+                sql = f"""
+                INSERT INTO {table_name} ({_INSERT_COLUMNS})
+                VALUES %s
+                """
+                values = _embedding_rows(data)
+                if values:
+                    execute_values(cursor, sql, values)
+
+            conn.commit()
+            print(f"Replaced {doc_name} with {len(values)} rows in {table_name}.")
+            return True
+    except psycopg2.Error as e:
+        print(f"Database error occurred: {e}")
+        return False
+
+def delete_document_embeddings(doc_names: list, table_name="embeddings_table") -> bool:
+    """
+    Deletes all rows belonging to the given documents.
+
+    Args:
+        doc_names (list[str]): Values of doc_name_column to delete.
+        table_name (str, optional): Table holding the embeddings. Defaults to "embeddings_table".
+
+    Returns:
+        bool: True if the rows were deleted, False otherwise.
+    """
+    if not doc_names:
+        return True
+
+    try:
+        with pooled_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(f"DELETE FROM {table_name} WHERE doc_name_column = ANY(%s)", (list(doc_names),))
+                deleted = cursor.rowcount
+            conn.commit()
+            print(f"Deleted {deleted} rows of {len(doc_names)} documents from {table_name}.")
+            return True
+    except psycopg2.Error as e:
+        print(f"Database error occurred: {e}")
+        return False
+
+# Retrieval filters, and the column each one restricts.
+FILTER_COLUMNS = {
+    "doc_names": "doc_name_column",
+    "source_types": "source_type_column",
+    "collections": "collection_column",
+}
+
+def _filter_conditions(filters) -> tuple:
+    """
+    Returns the SQL conditions for retrieval filters, with {name} bind markers, and
+    their arguments.
+
+    Supported filters: 'doc_names', 'source_types' and 'collections' (lists of values),
+    'since' and 'until' (datetimes bounding ingested_at_column, until exclusive).
+    """
+    filters = filters or {}
+    unknown = set(filters) - set(FILTER_COLUMNS) - {"since", "until"}
+    if unknown:
+        raise ValueError(f"Unsupported filters: {', '.join(sorted(unknown))}")
+
+    conditions, args = [], {}
+    for name, column in FILTER_COLUMNS.items():
+        if filters.get(name) is not None:
+            conditions.append(f"{column} = ANY({{{name}}}::text[])")
+            args[name] = list(filters[name])
+    if filters.get("since") is not None:
+        conditions.append("ingested_at_column >= {since}")
+        args["since"] = filters["since"]
+    if filters.get("until") is not None:
+        conditions.append("ingested_at_column < {until}")
+        args["until"] = filters["until"]
+    return conditions, args
+
+def _bind(template: str, args: dict, numeric: bool = False, **fragments) -> tuple:
+    """
+    Fills a query template: fragments are pasted in as SQL, then each {name} marker
+    becomes a bind parameter, %(name)s for psycopg2 or $n for asyncpg.
+
+    Returns:
+        tuple: (sql, args), with args as a dict for psycopg2 or a list for asyncpg.
+    """
+    for name, fragment in fragments.items():
+        template = template.replace(f"{{{name}}}", fragment)
+    if numeric:
+        names = list(args)
+        return template.format(**{name: f"${i}" for i, name in enumerate(names, start=1)}), [args[name] for name in names]
+    return template.format(**{name: f"%({name})s" for name in args}), args
+
+def _where(conditions, keyword="WHERE") -> str:
+    return f" {keyword} " + " AND ".join(conditions) if conditions else ""
+
+_KNN_SQL = """
+SELECT text_column
+FROM embeddings_table{where}
+ORDER BY embedding_column <=> {embedding}
+LIMIT {k}
+"""
+
+def ensure_duplicates_table():
+    """
+    Creates chunk_duplicates, which maps each chunk dropped by deduplication to the
+    stored chunk holding its content.
+    """
+    try:
+        with pooled_connection(vector=False) as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS chunk_duplicates (
+                        doc_name VARCHAR(255) NOT NULL,
+                        doc_index INTEGER NOT NULL,
+                        duplicate_of_doc VARCHAR(255) NOT NULL,
+                        duplicate_of_index INTEGER NOT NULL,
+                        PRIMARY KEY (doc_name, doc_index)
+                    )
+                """)
+                cursor.execute("""
+                    CREATE INDEX IF NOT EXISTS chunk_duplicates_canonical_idx
+                    ON chunk_duplicates (duplicate_of_doc, duplicate_of_index)
+                """)
+            conn.commit()
+    except psycopg2.Error as e:
+        print(f"Database error occurred: {e}")
+
+def save_chunk_duplicates(duplicates: list, replace_docs: list = ()) -> bool:
+    """
+    Stores which chunk each dropped duplicate points at, from the metadata collected in
+    ChunkDeduplicator.duplicates.
+
+    Args:
+        duplicates (list[dict]): Metadata of the dropped chunks, with 'doc', 'index' and
+                                 'duplicate_of' entries.
+        replace_docs (list[str], optional): Documents whose previous entries are removed
+                                            first, in the same transaction, e.g. because
+                                            they were re-ingested or deleted. Defaults to ().
+
+    Returns:
+        bool: True if the entries were saved, False otherwise.
+    """
+    values = [
+        (metadata['doc'], metadata['index'], metadata['duplicate_of']['doc'], metadata['duplicate_of']['index'])
+        for metadata in duplicates
+    ]
+    if not values and not replace_docs:
+        return True
+
+    try:
+        with pooled_connection(vector=False) as conn:
+            with conn.cursor() as cursor:
+                if replace_docs:
+                    cursor.execute("DELETE FROM chunk_duplicates WHERE doc_name = ANY(%s)", (list(replace_docs),))
+                execute_values(cursor, """
+                    INSERT INTO chunk_duplicates (doc_name, doc_index, duplicate_of_doc, duplicate_of_index)
+                    VALUES %s
+                    ON CONFLICT (doc_name, doc_index) DO UPDATE
+                    SET duplicate_of_doc = EXCLUDED.duplicate_of_doc,
+                        duplicate_of_index = EXCLUDED.duplicate_of_index
+                """, values)
+            conn.commit()
+            return True
+    except psycopg2.Error as e:
+        print(f"Database error occurred: {e}")
+        return False
+
+def get_top_k_similar_docs(query_embedding: list, k: int = 3, search_params: dict = None,
+                           filters: dict = None) -> list:
     """
     Connects to the database and retrieves the top-k most similar documents.
+
+    search_params trades recall for latency on this query only: 'search_list_size'
+    and 'rescore' for diskann indexes, 'ef_search' and 'iterative_scan' for hnsw
+    indexes. Knobs not given fall back to the VECTOR_* environment settings, then to
+    the server defaults.
+
+    filters restricts the search to 'doc_names', 'source_types' or 'collections', and
+    to rows ingested 'since' and/or 'until' a datetime. The filters are applied inside
+    the index scan, so k results are still returned when enough rows match; with hnsw,
+    set 'iterative_scan' for selective filters. On a partitioned table, source type or
+    collection filters only scan the matching partitions.
     """
     if not query_embedding:
         return []
 
-    conn = None
-    try:
-        conn = connect_pg()
-        # Register pgvector extension once per connection
-        register_vector(conn)
-        cur = conn.cursor()
+    conditions, args = _filter_conditions(filters)
+    sql, args = _bind(_KNN_SQL, {'embedding': np.array(query_embedding), 'k': k, **args},
+                      where=_where(conditions))
+    # Get the top k most similar documents using the KNN <=> operator
+    return _fetch_texts(sql, args, search_params)
+
+_COMPACT_KNN_SQL = """
+SELECT text_column
+FROM (
+    SELECT text_column, embedding_column
+    FROM embeddings_table{where}
+    ORDER BY {compact_column} {operator} {compact_query}
+    LIMIT {candidates}
+) c
+ORDER BY embedding_column <=> {embedding}
+LIMIT {k}
+"""
+
+def _compact_query(query_embedding, k, precision, dimensions, rescore_factor, filters, numeric=False):
+    conditions, args = _filter_conditions(filters)
+    args = {'embedding': np.array(query_embedding), 'k': k, 'candidates': k * rescore_factor, **args}
+    return _bind(
+        _COMPACT_KNN_SQL, args, numeric=numeric,
+        where=_where(conditions),
+        compact_column=_compact_expression("embedding_column", precision, dimensions),
+        operator=COMPACT_PRECISIONS[precision][1],
+        compact_query=_compact_expression("{embedding}::vector", precision, dimensions),
+    )
+
+def get_top_k_similar_docs_compact(query_embedding: list, k: int = 3,
+                                   precision: str = COMPACT_INDEX_PRECISION or "halfvec",
+                                   dimensions: int = COMPACT_INDEX_DIMENSIONS, rescore_factor: int = 4,
+                                   search_params: dict = None, filters: dict = None) -> list:
+    """
+    Retrieves the top-k most similar documents in two stages: k * rescore_factor
+    candidates are found through the compact index of create_compact_index, then
+    re-ranked by their exact distance to the full-precision embedding_column.
+
+    precision and dimensions must match those of the compact index. Raise
+    rescore_factor to recover the recall lost to quantization, binary in particular.
+    search_params and filters are as in get_top_k_similar_docs.
+
+    Returns:
+        list[str]: The text of the best documents, best first.
+    """
+    if not query_embedding:
+        return []
 
-        embedding_array = np.array(query_embedding)
+    sql, args = _compact_query(query_embedding, k, precision, dimensions, rescore_factor, filters)
+    return _fetch_texts(sql, args, search_params)
 
-        # Get the top k most similar documents using the KNN <=> operator
-        cur.execute("SELECT text_column FROM embeddings_table ORDER BY embedding_column <=> %s LIMIT %s", (embedding_array, k))
-        top_docs = cur.fetchall()
-        
-        return [doc[0] for doc in top_docs]
+_KNN_BATCH_SQL = """
+SELECT q.ordinality - 1, d.id, d.distance, d.text_column, d.metadata_column
+FROM unnest({embeddings}::vector[]) WITH ORDINALITY AS q(embedding, ordinality)
+CROSS JOIN LATERAL (
+    SELECT id, text_column, metadata_column, embedding_column <=> q.embedding AS distance
+    FROM embeddings_table{where}
+    ORDER BY embedding_column <=> q.embedding
+    LIMIT {k}
+) d
+ORDER BY q.ordinality, d.distance
+"""
+
+def get_top_k_similar_docs_batch(query_embeddings, k: int = 3, search_params: dict = None,
+                                 batch_size: int = 1000, filters: dict = None) -> list:
+    """
+    Retrieves the top-k most similar documents for many query embeddings at once.
+
+    Each group of batch_size queries is answered by a single statement: the query
+    vectors are unnested into rows and a LATERAL subquery runs the KNN search for each
+    one, so the cost is one round trip per batch instead of one per query.
+
+    Args:
+        query_embeddings (list | np.ndarray): The query vectors, one per row.
+        k (int, optional): Number of documents to return per query. Defaults to 3.
+        search_params (dict, optional): Query-time index knobs, as in get_top_k_similar_docs.
+                                        Defaults to None.
+        batch_size (int, optional): Maximum number of queries per statement. Defaults to 1000.
+        filters (dict, optional): Retrieval filters applied to every query, as in
+                                  get_top_k_similar_docs. Defaults to None.
+
+    Returns:
+        list[list[dict]]: For each query, in input order, its matches ranked by distance as
+                          dicts with 'id', 'distance', 'text' and 'metadata' (page,
+                          headings...) keys. Empty lists are
+                          returned for every query if the database query fails.
+    """
+    queries = [np.asarray(embedding, dtype=np.float32) for embedding in query_embeddings]
+    results = [[] for _ in queries]
+    if not queries:
+        return results
+
+    conditions, filter_args = _filter_conditions(filters)
+    try:
+        with pooled_connection() as conn:
+            with conn.cursor() as cur:
+                _apply_search_settings(cur, search_params)
+
+                for start in range(0, len(queries), batch_size):
+                    args = {'embeddings': queries[start:start + batch_size], 'k': k, **filter_args}
+                    cur.execute(*_bind(_KNN_BATCH_SQL, args, where=_where(conditions)))
+                    for position, doc_id, distance, text, metadata in cur.fetchall():
+                        results[start + position].append(
+                            {'id': doc_id, 'distance': distance, 'text': text, 'metadata': metadata}
+                        )
+        return results
     except psycopg2.Error as e:
         print(f"Database error occurred: {e}")
+        return [[] for _ in queries]
+
+_HYBRID_SQL = """
+WITH vector_hits AS (
+    SELECT id, row_number() OVER (ORDER BY distance) AS rank
+    FROM (
+        SELECT id, embedding_column <=> {embedding} AS distance
+        FROM embeddings_table{where}
+        ORDER BY embedding_column <=> {embedding}
+        LIMIT {vector_depth}
+    ) v
+),
+text_hits AS (
+    SELECT id, row_number() OVER (ORDER BY score DESC) AS rank
+    FROM (
+        SELECT id, ts_rank_cd(text_search_column, query) AS score
+        FROM embeddings_table, websearch_to_tsquery({config}, {query_text}) AS query
+        WHERE text_search_column @@ query{and_filters}
+        ORDER BY score DESC
+        LIMIT {text_depth}
+    ) t
+),
+fused AS (
+    SELECT id, sum(score) AS score
+    FROM (
+        SELECT id, {vector_weight}::float8 / ({rrf_k} + rank) AS score FROM vector_hits
+        UNION ALL
+        SELECT id, {text_weight}::float8 / ({rrf_k} + rank) AS score FROM text_hits
+    ) s
+    GROUP BY id
+)
+SELECT e.text_column
+FROM fused f
+JOIN embeddings_table e USING (id)
+ORDER BY f.score DESC, f.id
+LIMIT {k}
+"""
+
+def _hybrid_query(query_embedding, query_text, k, vector_weight, text_weight, vector_depth, text_depth,
+                  filters, numeric=False):
+    conditions, filter_args = _filter_conditions(filters)
+    args = {
+        'embedding': np.array(query_embedding),
+        'vector_depth': vector_depth or max(4 * k, 20),
+        'query_text': query_text,
+        'text_depth': text_depth or max(4 * k, 20),
+        'vector_weight': vector_weight,
+        'rrf_k': RRF_K,
+        'text_weight': text_weight,
+        'k': k,
+        **filter_args,
+    }
+    return _bind(_HYBRID_SQL, args, numeric=numeric, config=_text_search_config(),
+                 where=_where(conditions), and_filters=_where(conditions, "AND"))
+
+def get_top_k_hybrid_docs(query_embedding: list, query_text: str, k: int = 3,
+                          vector_weight: float = 1.0, text_weight: float = 1.0,
+                          vector_depth: int = None, text_depth: int = None,
+                          search_params: dict = None, filters: dict = None) -> list:
+    """
+    Retrieves the top-k documents by fusing vector similarity and full-text search.
+
+    The nearest neighbours of query_embedding and the best full-text matches of
+    query_text are ranked separately, then combined with reciprocal rank fusion,
+    weight / (RRF_K + rank), in a single query. The full-text leg catches exact
+    identifiers, such as account codes or product names, that embeddings miss.
+    Requires the column added by ensure_text_search_column.
+
+    Args:
+        query_embedding (list[float]): The embedding of the question.
+        query_text (str): The question, in web search syntax (quotes, OR, -term).
+        k (int, optional): Number of documents to return. Defaults to 3.
+        vector_weight (float, optional): Weight of the vector ranking. Defaults to 1.0.
+        text_weight (float, optional): Weight of the full-text ranking. Defaults to 1.0.
+        vector_depth (int, optional): Number of vector candidates to fuse. Defaults to max(4k, 20).
+        text_depth (int, optional): Number of full-text candidates to fuse. Defaults to max(4k, 20).
+        search_params (dict, optional): Query-time index knobs, as in get_top_k_similar_docs.
+                                        Defaults to None.
+        filters (dict, optional): Retrieval filters applied to both rankings, as in
+                                  get_top_k_similar_docs. Defaults to None.
+
+    Returns:
+        list[str]: The text of the best documents, best first.
+    """
+    if not query_embedding:
         return []
-    finally:
-        if conn:
-            conn.close()
+
+    sql, args = _hybrid_query(query_embedding, query_text, k, vector_weight, text_weight,
+                              vector_depth, text_depth, filters)
+    return _fetch_texts(sql, args, search_params)
+
+async def aget_top_k_similar_docs(query_embedding: list, k: int = 3, search_params: dict = None,
+                                  filters: dict = None) -> list:
+    """
+    Async version of get_top_k_similar_docs, served from the asyncpg pool so the
+    event loop keeps running while the query is in flight.
+    """
+    if not query_embedding:
+        return []
+
+    conditions, args = _filter_conditions(filters)
+    sql, args = _bind(_KNN_SQL, {'embedding': np.array(query_embedding), 'k': k, **args},
+                      numeric=True, where=_where(conditions))
+    return await _afetch_texts(sql, args, search_params)
+
+async def aget_top_k_hybrid_docs(query_embedding: list, query_text: str, k: int = 3,
+                                 vector_weight: float = 1.0, text_weight: float = 1.0,
+                                 vector_depth: int = None, text_depth: int = None,
+                                 search_params: dict = None, filters: dict = None) -> list:
+    """
+    Async version of get_top_k_hybrid_docs, served from the asyncpg pool.
+    """
+    if not query_embedding:
+        return []
+
+    sql, args = _hybrid_query(query_embedding, query_text, k, vector_weight, text_weight,
+                              vector_depth, text_depth, filters, numeric=True)
+    return await _afetch_texts(sql, args, search_params)
+
+async def aget_top_k_similar_docs_compact(query_embedding: list, k: int = 3,
+                                          precision: str = COMPACT_INDEX_PRECISION or "halfvec",
+                                          dimensions: int = COMPACT_INDEX_DIMENSIONS, rescore_factor: int = 4,
+                                          search_params: dict = None, filters: dict = None) -> list:
+    """
+    Async version of get_top_k_similar_docs_compact, served from the asyncpg pool.
+    """
+    if not query_embedding:
+        return []
+
+    sql, args = _compact_query(query_embedding, k, precision, dimensions, rescore_factor, filters, numeric=True)
+    return await _afetch_texts(sql, args, search_params)
@@ -1,9 +1,14 @@
+import asyncio
+import time
 import httpx
 from collections.abc import Iterable
 from pydantic import Field
 
 from graphiti_core.embedder.client import EmbedderClient, EmbedderConfig
 
+from utils.embedding_cache import get_embedding_cache
+from utils.embedding_scheduler import EmbeddingScheduler
+
 DEFAULT_EMBEDDING_MODEL = "nomic-embed-text"
 
 
@@ -11,18 +16,78 @@ class OllamaEmbedderConfig(EmbedderConfig):
     embedding_model: str = DEFAULT_EMBEDDING_MODEL
     base_url: str = "http://127.0.0.1:11434"  
     timeout: int = 240
+    batch_size: int = Field(default=32, description="Maximum number of inputs per /api/embed request.")
+    token_budget: int | None = Field(default=None, description="Initial padded tokens per request, adapted at runtime.")
+    max_concurrency: int = Field(default=4, description="Maximum number of in-flight /api/embed requests.")
+    max_keepalive_connections: int = Field(default=8, description="Idle connections kept open for reuse.")
 
 
 class OllamaEmbedder(EmbedderClient):
     """
     Ollama Embedder Client \
-    Calls Ollama's /api/embeddings endpoint to generate vector embeddings.
+    Calls Ollama's /api/embed endpoint to generate vector embeddings.
+
+    All requests share one pooled keep-alive HTTP client, created on first use,
+    and at most max_concurrency of them are in flight at once. Inputs already in
+    the persistent embedding cache are not sent, and the rest are grouped into
+    requests of similar token length by an EmbeddingScheduler. Call aclose()
+    when done with the embedder.
     """
 
     def __init__(self, config: OllamaEmbedderConfig | None = None):
         if config is None:
             config = OllamaEmbedderConfig()
         self.config = config
+        self._client: httpx.AsyncClient | None = None
+        self._semaphore = asyncio.Semaphore(config.max_concurrency)
+        self._scheduler = EmbeddingScheduler(max_batch_size=config.batch_size)
+        if config.token_budget:
+            self._scheduler.token_budget = config.token_budget
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.config.base_url,
+                timeout=self.config.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.config.max_concurrency,
+                    max_keepalive_connections=self.config.max_keepalive_connections,
+                ),
+            )
+        return self._client
+
+    async def aclose(self) -> None:
+        """
+        Close the pooled HTTP client and its connections.
+        """
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def __aenter__(self) -> "OllamaEmbedder":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+
+    async def _embed(self, inputs: list[str], padded_tokens: int = 0) -> list[list[float]]:
+        """
+        Embeds a list of inputs with a single /api/embed request.
+        """
+        payload = {"model": self.config.embedding_model, "input": inputs}
+
+        async with self._semaphore:
+            started = time.perf_counter()
+            resp = await self._get_client().post("/api/embed", json=payload)
+            latency = time.perf_counter() - started
+        resp.raise_for_status()
+        self._scheduler.record(padded_tokens, latency)
+        data = resp.json()
+
+        embeddings = data.get("embeddings", [])
+        if len(embeddings) != len(inputs):
+            raise ValueError(f"Ollama returned {len(embeddings)} embeddings for {len(inputs)} inputs")
+        return [embedding[: self.config.embedding_dim] for embedding in embeddings]
 
     async def create(
         self, input_data: str | list[str] | Iterable[int] | Iterable[Iterable[int]]
@@ -37,23 +102,31 @@ class OllamaEmbedder(EmbedderClient):
         else:
             raise TypeError("Ollama embedder only supports str or list[str] inputs")
 
-        url = f"{self.config.base_url}/api/embeddings"
-        payload = {"model": self.config.embedding_model, "prompt": input_str}
-
-        async with httpx.AsyncClient(timeout=self.config.timeout) as client:
-            resp = await client.post(url, json=payload)
-            resp.raise_for_status()
-            data = resp.json()
-
-        embedding = data.get("embedding", [])
-        return embedding[: self.config.embedding_dim]
+        return (await self.create_batch([input_str]))[0]
 
     async def create_batch(self, input_data_list: list[str]) -> list[list[float]]:
         """
-        Ollama currently does not support true batch embedding.
-        We emulate it by looping requests.
+        Create embeddings for many inputs, grouped into requests by token length.
+        Requests run concurrently and embeddings are returned in input order.
         """
-        results: list[list[float]] = []
-        for text in input_data_list:
-            results.append(await self.create(text))
-        return results
\ No newline at end of file
+        cache = get_embedding_cache()
+        model, dim = self.config.embedding_model, self.config.embedding_dim
+        results = cache.get_many(model, dim, input_data_list) if cache else [None] * len(input_data_list)
+        missing = [i for i, embedding in enumerate(results) if embedding is None]
+        if not missing:
+            return results
+
+        missing_texts = [input_data_list[i] for i in missing]
+        plan = self._scheduler.plan(missing_texts)
+        batches = await asyncio.gather(
+            *(self._embed([missing_texts[i] for i in batch], padded_tokens) for batch, padded_tokens in plan)
+        )
+        embeddings = [None] * len(missing_texts)
+        for (batch, _), batch_embeddings in zip(plan, batches):
+            for i, embedding in zip(batch, batch_embeddings):
+                embeddings[i] = embedding
+        for i, embedding in zip(missing, embeddings):
+            results[i] = embedding
+        if cache:
+            cache.put_many(model, dim, missing_texts, embeddings)
+        return results
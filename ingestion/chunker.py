@@ -0,0 +1,81 @@
+from bisect import bisect_right
+from collections import deque
+from utils.token_utils import EMBEDDING_MAX_TOKENS, iter_token_offsets
+
+# Tokens reserved for the special tokens the embedding model adds around each input.
+_SPECIAL_TOKENS = 2
+
+
+def _inside_word(text: str, offset: int) -> bool:
+    return 0 < offset < len(text) and text[offset - 1].isalnum() and text[offset].isalnum()
+
+
+def iter_chunk_spans(text: str, max_tokens: int = 512, overlap_tokens: int = 64):
+    """
+    Lazily splits a text into overlapping chunks measured in embedding model tokens.
+
+    Only token offsets are kept in memory, never chunk strings, so this works over
+    very long inputs.
+
+    Args:
+        text (str): The text to split.
+        max_tokens (int, optional): Maximum number of tokens per chunk. Capped to the
+                                    embedding model context. Defaults to 512.
+        overlap_tokens (int, optional): Number of tokens shared by consecutive chunks. Defaults to 64.
+
+    Yields:
+        tuple[int, int]: The (start, end) character offsets of each chunk in text.
+    """
+    max_tokens = min(max_tokens, EMBEDDING_MAX_TOKENS - _SPECIAL_TOKENS)
+    overlap_tokens = min(overlap_tokens, max_tokens - 1)
+
+    window = deque()
+    new_tokens = 0
+    for token in iter_token_offsets(text):
+        window.append(token)
+        new_tokens += 1
+        if len(window) == max_tokens:
+            yield window[0][0], window[-1][1]
+            for _ in range(max_tokens - overlap_tokens):
+                window.popleft()
+            # Never start the next chunk in the middle of a word.
+            while len(window) > 1 and _inside_word(text, window[0][0]):
+                window.popleft()
+            new_tokens = 0
+    if new_tokens:
+        yield window[0][0], window[-1][1]
+
+
+def page_at(page_spans: tuple, offset: int):
+    """
+    Returns the page number containing a character offset, given (char_offset, page_no) spans.
+    """
+    if not page_spans:
+        return None
+    span = bisect_right([start for start, _ in page_spans], offset) - 1
+    return page_spans[max(span, 0)][1]
+
+
+def iter_chunks(text: str, doc_name: str, max_tokens: int = 512, overlap_tokens: int = 64, page_spans: tuple = None):
+    """
+    Lazily yields token-budgeted chunks of a text, in the format used for embedding.
+
+    Each chunk string is only sliced out of the source text when the chunk is reached.
+
+    Args:
+        text (str): The text to split.
+        doc_name (str): The name or title of the document the text belongs to.
+        max_tokens (int, optional): Maximum number of tokens per chunk. Defaults to 512.
+        overlap_tokens (int, optional): Number of tokens shared by consecutive chunks. Defaults to 64.
+        page_spans (tuple, optional): (char_offset, page_no) pairs marking where each page
+                                      starts in the text. Defaults to None.
+
+    Yields:
+        dict: {'text': str, 'metadata_': {'doc': str, 'index': int, 'start': int, 'end': int}},
+              with an additional 'page' metadata key when page_spans is given.
+    """
+    for index, (start, end) in enumerate(iter_chunk_spans(text, max_tokens, overlap_tokens)):
+        metadata = {'doc': doc_name, 'index': index, 'start': start, 'end': end}
+        if page_spans:
+            metadata['page'] = page_at(page_spans, start)
+        yield {'text': text[start:end], 'metadata_': metadata}
@@ -0,0 +1,126 @@
+import hashlib
+import os
+import re
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Maximum number of differing SimHash bits for two chunks to count as near-duplicates.
+# 0 keeps only exact-duplicate detection: document chunks that differ in a few figures
+# (another period, another account) are routinely within a few bits of each other.
+DEDUP_HAMMING_THRESHOLD = int(os.getenv('DEDUP_HAMMING_THRESHOLD', 0))
+# Threshold for sitemap crawls, where near-identical pages are boilerplate.
+SITE_DEDUP_HAMMING_THRESHOLD = int(os.getenv('SITE_DEDUP_HAMMING_THRESHOLD', 3))
+
+_SIMHASH_BITS = 64
+_WORD_PATTERN = re.compile(r"\w+")
+
+
+def _hash64(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+def simhash(words: list, shingle_size: int = 3) -> int:
+    """
+    Computes the 64-bit SimHash of a text from its word shingles.
+
+    Args:
+        words (list[str]): The normalized words of the text.
+        shingle_size (int, optional): Number of words per shingle. Defaults to 3.
+
+    Returns:
+        int: The SimHash fingerprint.
+    """
+    weights = [0] * _SIMHASH_BITS
+    for i in range(max(len(words) - shingle_size + 1, 1)):
+        shingle_hash = _hash64(" ".join(words[i:i + shingle_size]))
+        for bit in range(_SIMHASH_BITS):
+            weights[bit] += 1 if shingle_hash >> bit & 1 else -1
+    return sum(1 << bit for bit, weight in enumerate(weights) if weight > 0)
+
+
+class ChunkDeduplicator:
+    """
+    Drops exact and near-duplicate chunks before they are embedded.
+
+    Exact duplicates are found by hashing the normalized chunk text. Near-duplicates,
+    when enabled with a non-zero threshold, are found by SimHash: two chunks are near-duplicates when their fingerprints differ
+    in at most `threshold` bits. Fingerprints are indexed in threshold + 1 bands, so by
+    the pigeonhole principle any near-duplicate shares at least one band with its
+    canonical chunk and lookups stay sub-linear.
+
+    A dropped chunk gets a 'duplicate_of' metadata entry pointing at the (doc, index)
+    of the canonical chunk with the same content, which is always a kept chunk, and is
+    recorded in `duplicates`; db_connector.save_chunk_duplicates stores those mappings.
+    """
+
+    def __init__(self, threshold: int = DEDUP_HAMMING_THRESHOLD, shingle_size: int = 3, min_words: int = 8):
+        """
+        Args:
+            threshold (int, optional): Maximum Hamming distance between near-duplicate
+                                       fingerprints. 0 disables near-duplicate detection.
+                                       Defaults to DEDUP_HAMMING_THRESHOLD.
+            shingle_size (int, optional): Number of words per SimHash shingle. Defaults to 3.
+            min_words (int, optional): Chunks with fewer words are only checked for exact
+                                       duplicates, as their fingerprints are unreliable. Defaults to 8.
+        """
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        self.min_words = min_words
+        self.bands = threshold + 1
+        self.band_bits = _SIMHASH_BITS // self.bands
+        self.exact = {}
+        self.band_index = [{} for _ in range(self.bands)]
+        self.duplicates = []
+
+    def _bands(self, fingerprint: int):
+        mask = (1 << self.band_bits) - 1
+        return [(fingerprint >> (band * self.band_bits)) & mask for band in range(self.bands)]
+
+    def find_canonical(self, chunk: dict):
+        """
+        Returns the (doc, index) reference of the chunk this one duplicates, or None after
+        registering it as a new canonical chunk.
+        """
+        words = _WORD_PATTERN.findall(chunk['text'].lower())
+        content_hash = hashlib.sha1(" ".join(words).encode('utf-8')).hexdigest()
+        canonical = self.exact.get(content_hash)
+        if canonical is not None:
+            return canonical
+
+        reference = {'doc': chunk['metadata_']['doc'], 'index': chunk['metadata_']['index']}
+        if self.threshold <= 0 or len(words) < self.min_words:
+            self.exact[content_hash] = reference
+            return None
+
+        fingerprint = simhash(words, self.shingle_size)
+        bands = self._bands(fingerprint)
+        for band, key in enumerate(bands):
+            for candidate, candidate_reference in self.band_index[band].get(key, ()):
+                if bin(candidate ^ fingerprint).count("1") <= self.threshold:
+                    # This chunk is dropped, so later exact copies must point past it.
+                    self.exact[content_hash] = candidate_reference
+                    return candidate_reference
+
+        self.exact[content_hash] = reference
+        for band, key in enumerate(bands):
+            self.band_index[band].setdefault(key, []).append((fingerprint, reference))
+        return None
+
+    def filter(self, chunks):
+        """
+        Lazily yields the chunks that are not duplicates of an earlier chunk.
+
+        Args:
+            chunks (Iterable[dict]): Chunks in the format produced by chunk_text.
+
+        Yields:
+            dict: The canonical chunks.
+        """
+        for chunk in chunks:
+            canonical = self.find_canonical(chunk)
+            if canonical is None:
+                yield chunk
+                continue
+            chunk['metadata_']['duplicate_of'] = canonical
+            self.duplicates.append(chunk['metadata_'])
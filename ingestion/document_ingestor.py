@@ -1,10 +1,95 @@
+import logging
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
-from ingestion.extractor.document_extractor import extract_to
-from ingestion.vector import get_embedding_ollama, chunk_text
+from db_connector import delete_document_embeddings, replace_document_embeddings, save_chunk_duplicates
+from ingestion.dedup import ChunkDeduplicator
+from ingestion.embedding_batch import EmbeddingBatch
+from ingestion.extractor.document_extractor import extract_to, init_worker
+from ingestion.manifest import diff_manifest, load_manifest, save_manifest
+from ingestion.structured_chunker import iter_document_chunks
+from ingestion.vector import get_embeddings_ollama
 from utils.document_utils import get_document_filenames
 
+_log = logging.getLogger(__name__)
 
-def doc_to_vector():
+
+def _extract_in_worker(doc_path: str, **extract_kwargs):
+    """
+    Runs extract_to inside a pool worker and reports failures as data, so a single
+    bad file does not raise out of the pool.
+    """
+    try:
+        return doc_path, extract_to(doc_path, **extract_kwargs), None
+    except Exception as e:
+        return doc_path, None, str(e)
+
+
+def iter_extracted_documents(
+    doc_paths: list,
+    parallel: bool = False,
+    max_workers: int = None,
+    pages_per_shard: int = None,
+    adaptive_pdf: bool = False,
+):
+    """
+    Extracts the given documents, optionally across a pool of worker processes.
+
+    In parallel mode every worker keeps its own long-lived docling converter and
+    results are yielded in completion order. Files that fail to extract are logged
+    and skipped in both modes.
+
+    Args:
+        doc_paths (list[str]): Paths of the documents to extract.
+        parallel (bool, optional): If True, extract with a ProcessPoolExecutor. Defaults to False.
+        max_workers (int, optional): Number of worker processes. Defaults to the CPU count.
+        pages_per_shard (int, optional): Split PDFs longer than this many pages into page-range
+                                         shards converted concurrently. Only used in sequential
+                                         mode, since parallel mode already keeps every worker
+                                         busy with whole files. Defaults to None.
+        adaptive_pdf (bool, optional): Only send scanned or image-heavy PDF pages through the
+                                       full layout/OCR pipeline. Defaults to False.
+
+    Yields:
+        tuple[str, ExtractionResult]: The document path and its extraction result.
+    """
+    if not parallel:
+        for doc_path in doc_paths:
+            _, data, error = _extract_in_worker(
+                doc_path, pages_per_shard=pages_per_shard, max_workers=max_workers, adaptive_pdf=adaptive_pdf
+            )
+            if error:
+                _log.error(f"Failed to extract {doc_path}. Error: {error}")
+                continue
+            yield doc_path, data
+        return
+
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=init_worker) as executor:
+        futures = {
+            executor.submit(_extract_in_worker, doc_path, adaptive_pdf=adaptive_pdf): doc_path
+            for doc_path in doc_paths
+        }
+        for future in as_completed(futures):
+            try:
+                doc_path, data, error = future.result()
+            except Exception as e:
+                # The worker process itself died (e.g. out of memory).
+                doc_path, data, error = futures[future], None, str(e)
+            if error:
+                _log.error(f"Failed to extract {doc_path}. Error: {error}")
+                continue
+            yield doc_path, data
+
+
+def doc_to_vector(
+    parallel: bool = False,
+    max_workers: int = None,
+    pages_per_shard: int = None,
+    adaptive_pdf: bool = False,
+    structured_chunks: bool = False,
+    deduplicate: bool = True,
+    collection: str = None,
+    duplicates: list = None,
+):
     """
     Processes all documents in the designated data folder, chunks their content,
     and generates vector embeddings for each chunk.
@@ -14,21 +99,123 @@ def doc_to_vector():
     into smaller, manageable chunks, and then uses a pre-configured embedding model
     (e.g., from Ollama) to generate a vector representation for each chunk.
 
+    Args:
+        parallel (bool, optional): If True, extract the documents across a pool of worker
+                                   processes. Defaults to False.
+        max_workers (int, optional): Number of extraction worker processes when running in
+                                     parallel. Defaults to the CPU count.
+        pages_per_shard (int, optional): Split large PDFs into page-range shards of this many
+                                         pages, converted concurrently. Defaults to None.
+        adaptive_pdf (bool, optional): Only send scanned or image-heavy PDF pages through the
+                                       full layout/OCR pipeline. Defaults to False.
+        structured_chunks (bool, optional): Chunk along the docling document structure instead
+                                            of by token count alone. Defaults to False.
+        deduplicate (bool, optional): Drop duplicate chunks, across all documents, before
+                                      embedding them. Near-duplicates are only dropped when
+                                      DEDUP_HAMMING_THRESHOLD is set. Defaults to True.
+        collection (str, optional): Collection (e.g. customer) the documents belong to, stored
+                                    with each chunk for filtered retrieval. Defaults to None.
+        duplicates (list, optional): Receives the metadata, 'duplicate_of' included, of every
+                                     dropped duplicate chunk, e.g. for save_chunk_duplicates.
+                                     Defaults to None.
+
     Returns:
-        list[dict]: A list of dictionaries, where each dictionary represents a chunk
-                    of document content with its corresponding vector embedding.
-                    The format for each dictionary is expected to be:
-                    [{'text': str, 'metadata_': {'doc': str, 'index': int}, 'embedding': list[float]}]
+        EmbeddingBatch: The embedded chunks of all documents, with the embeddings as one
+                        float32 matrix. Use EmbeddingBatch.to_chunks() for the former
+                        [{'text': str, 'metadata_': {'doc': str, 'index': int, ...}, 'embedding': list[float]}]
+                        format.
     """
     doc_list = get_document_filenames()
-    chunks = []
+    batches = []
     data_folder = Path("data/documents")
-    for doc in doc_list:
-        data = extract_to(f"{data_folder}/{doc}")
-        file_name = data[0]
-        file_content = data[1]
-        chunks = chunk_text(file_content, file_name)
-        for chunki in chunks:
-            embedding = get_embedding_ollama(chunki['text'])
-            chunki['embedding'] = embedding
-    return chunks
\ No newline at end of file
+    doc_paths = [f"{data_folder}/{doc}" for doc in doc_list]
+    extracted = iter_extracted_documents(
+        doc_paths, parallel=parallel, max_workers=max_workers,
+        pages_per_shard=pages_per_shard, adaptive_pdf=adaptive_pdf
+    )
+    deduplicator = ChunkDeduplicator()
+    for _, data in extracted:
+        doc_chunks = iter_document_chunks(data, structured=structured_chunks, collection=collection)
+        doc_chunks = list(deduplicator.filter(doc_chunks) if deduplicate else doc_chunks)
+        embeddings = get_embeddings_ollama([chunki['text'] for chunki in doc_chunks])
+        batches.append(EmbeddingBatch.from_chunks(doc_chunks, embeddings))
+    if deduplicate:
+        print(f"Skipped {len(deduplicator.duplicates)} duplicate chunks.")
+    if duplicates is not None:
+        duplicates.extend(deduplicator.duplicates)
+    return EmbeddingBatch.concat(batches)
+
+
+def sync_documents(
+    parallel: bool = False,
+    max_workers: int = None,
+    pages_per_shard: int = None,
+    adaptive_pdf: bool = False,
+    structured_chunks: bool = False,
+    deduplicate: bool = True,
+    collection: str = None,
+):
+    """
+    Incrementally synchronizes 'data/documents' with the embeddings table.
+
+    A manifest of file path, size, mtime and content hash decides what to do with each
+    file: unchanged files are skipped, new or changed files are extracted, embedded and
+    have their rows replaced atomically, and files that disappeared have their rows
+    removed. The manifest is saved after every document so an interrupted run keeps
+    its progress. Rows that earlier versions stored under the file name without its
+    extension are replaced in the same transaction, including on the first run, when
+    there is no manifest yet.
+
+    Args:
+        parallel (bool, optional): If True, extract the documents across a pool of worker
+                                   processes. Defaults to False.
+        max_workers (int, optional): Number of extraction worker processes. Defaults to the CPU count.
+        pages_per_shard (int, optional): Split large PDFs into page-range shards of this many
+                                         pages, converted concurrently. Defaults to None.
+        adaptive_pdf (bool, optional): Only send scanned or image-heavy PDF pages through the
+                                       full layout/OCR pipeline. Defaults to False.
+        structured_chunks (bool, optional): Chunk along the docling document structure instead
+                                            of by token count alone. Defaults to False.
+        deduplicate (bool, optional): Drop duplicate chunks within each document before
+                                      embedding them. Near-duplicates are only dropped when
+                                      DEDUP_HAMMING_THRESHOLD is set. Duplicates are not
+                                      tracked across documents, since those may be
+                                      replaced or deleted independently. Defaults to True.
+        collection (str, optional): Collection (e.g. customer) the documents belong to, stored
+                                    with each chunk for filtered retrieval. Defaults to None.
+    """
+    manifest = load_manifest()
+    data_folder = Path("data/documents")
+    doc_paths = [f"{data_folder}/{doc}" for doc in get_document_filenames()]
+    changed, deleted = diff_manifest(manifest, doc_paths)
+    print(f"{len(changed)} new or changed, {len(deleted)} deleted, "
+          f"{len(doc_paths) - len(changed)} unchanged documents.")
+
+    deleted_docs = [manifest[doc_path]['doc'] for doc_path in deleted]
+    if deleted and delete_document_embeddings(deleted_docs) and save_chunk_duplicates([], replace_docs=deleted_docs):
+        for doc_path in deleted:
+            del manifest[doc_path]
+    save_manifest(manifest)
+
+    extracted = iter_extracted_documents(
+        list(changed), parallel=parallel, max_workers=max_workers,
+        pages_per_shard=pages_per_shard, adaptive_pdf=adaptive_pdf
+    )
+    for doc_path, data in extracted:
+        chunks = iter_document_chunks(data, structured=structured_chunks, collection=collection)
+        deduplicator = ChunkDeduplicator()
+        chunks = list(deduplicator.filter(chunks) if deduplicate else chunks)
+        embeddings = get_embeddings_ollama([chunki['text'] for chunki in chunks])
+        if None in embeddings:
+            # Keep the old rows rather than replacing them with a partial document.
+            _log.error(f"Failed to embed all chunks of {doc_path}, it will be retried on the next run.")
+            continue
+        # Earlier versions stored documents under the file name without extension, and
+        # tables filled before the manifest existed have no entry recording that name.
+        former_name = manifest[doc_path]['doc'] if doc_path in manifest else Path(doc_path).stem
+        former_names = [former_name] if former_name != data.doc_filename else []
+        batch = EmbeddingBatch.from_chunks(chunks, embeddings)
+        if replace_document_embeddings(data.doc_filename, batch, former_names=former_names):
+            save_chunk_duplicates(deduplicator.duplicates, replace_docs=[data.doc_filename, *former_names])
+            manifest[doc_path] = changed[doc_path]
+            save_manifest(manifest)
@@ -0,0 +1,112 @@
+from dataclasses import dataclass, field
+import numpy as np
+
+# Metadata keys stored in their own columns rather than in EmbeddingBatch.metadata.
+_COLUMN_KEYS = ('doc', 'index')
+
+
+@dataclass
+class EmbeddingBatch:
+    """
+    Columnar batch of embedded chunks.
+
+    Embeddings are one contiguous float32 matrix instead of a list of Python float
+    lists, and chunk texts are one string buffer addressed by an offsets array.
+    Row i is text_buffer[text_offsets[i]:text_offsets[i + 1]], doc_names[i],
+    doc_indices[i], embeddings[i] and metadata[i].
+    """
+    embeddings: np.ndarray
+    text_buffer: str = ""
+    text_offsets: np.ndarray = field(default_factory=lambda: np.zeros(1, dtype=np.int64))
+    doc_names: list = field(default_factory=list)
+    doc_indices: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=np.int32))
+    metadata: list = field(default_factory=list)
+
+    def __len__(self):
+        return len(self.doc_names)
+
+    @classmethod
+    def empty(cls, dim: int = 0) -> "EmbeddingBatch":
+        return cls(embeddings=np.zeros((0, dim), dtype=np.float32))
+
+    @classmethod
+    def from_chunks(cls, chunks: list, embeddings) -> "EmbeddingBatch":
+        """
+        Builds a batch from chunk dicts and their embeddings. Chunks whose embedding is
+        None (failed requests) are left out.
+
+        Args:
+            chunks (list[dict]): Chunks in the format produced by chunk_text.
+            embeddings (list[list[float]] | np.ndarray): One embedding per chunk, in order.
+
+        Returns:
+            EmbeddingBatch: The embedded chunks.
+        """
+        kept = [(chunk, embedding) for chunk, embedding in zip(chunks, embeddings) if embedding is not None]
+        if not kept:
+            return cls.empty()
+
+        matrix = np.ascontiguousarray([embedding for _, embedding in kept], dtype=np.float32)
+        lengths = [len(chunk['text']) for chunk, _ in kept]
+        offsets = np.zeros(len(kept) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        return cls(
+            embeddings=matrix,
+            text_buffer="".join(chunk['text'] for chunk, _ in kept),
+            text_offsets=offsets,
+            doc_names=[chunk['metadata_']['doc'] for chunk, _ in kept],
+            doc_indices=np.array([chunk['metadata_']['index'] for chunk, _ in kept], dtype=np.int32),
+            metadata=[
+                {key: value for key, value in chunk['metadata_'].items() if key not in _COLUMN_KEYS}
+                for chunk, _ in kept
+            ],
+        )
+
+    @classmethod
+    def concat(cls, batches: list) -> "EmbeddingBatch":
+        """
+        Concatenates batches into one, copying each column once.
+        """
+        batches = [batch for batch in batches if len(batch)]
+        if not batches:
+            return cls.empty()
+        if len(batches) == 1:
+            return batches[0]
+
+        offsets = [batches[0].text_offsets]
+        shift = batches[0].text_offsets[-1]
+        for batch in batches[1:]:
+            offsets.append(batch.text_offsets[1:] + shift)
+            shift += batch.text_offsets[-1]
+        return cls(
+            embeddings=np.concatenate([batch.embeddings for batch in batches]),
+            text_buffer="".join(batch.text_buffer for batch in batches),
+            text_offsets=np.concatenate(offsets),
+            doc_names=[name for batch in batches for name in batch.doc_names],
+            doc_indices=np.concatenate([batch.doc_indices for batch in batches]),
+            metadata=[metadata for batch in batches for metadata in batch.metadata],
+        )
+
+    def text(self, i: int) -> str:
+        return self.text_buffer[self.text_offsets[i]:self.text_offsets[i + 1]]
+
+    def rows(self):
+        """
+        Lazily yields (text, doc_name, doc_index, embedding) database rows, with each
+        embedding as a float32 view into the matrix.
+        """
+        for i in range(len(self)):
+            yield self.text(i), self.doc_names[i], int(self.doc_indices[i]), self.embeddings[i]
+
+    def to_chunks(self) -> list:
+        """
+        Converts the batch back to the list of chunk dicts used before EmbeddingBatch.
+        """
+        return [
+            {
+                'text': text,
+                'metadata_': {'doc': doc_name, 'index': doc_index, **self.metadata[i]},
+                'embedding': embedding.tolist(),
+            }
+            for i, (text, doc_name, doc_index, embedding) in enumerate(self.rows())
+        ]
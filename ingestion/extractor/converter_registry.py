@@ -0,0 +1,130 @@
+import json
+import logging
+import threading
+from docling.backend.pypdfium2_backend import PyPdfiumDocumentBackend
+from docling.datamodel.base_models import InputFormat
+from docling.document_converter import (
+    DocumentConverter,
+    PdfFormatOption,
+    WordFormatOption,
+)
+from docling.pipeline.simple_pipeline import SimplePipeline
+from docling.pipeline.standard_pdf_pipeline import StandardPdfPipeline
+
+_log = logging.getLogger(__name__)
+
+DOCUMENT_PROFILE = "document"
+HTML_PROFILE = "html"
+
+
+def _build_document_converter():
+    return (
+        DocumentConverter(  # all of the below is optional, has internal defaults.
+            allowed_formats=[
+                InputFormat.PDF,
+                InputFormat.IMAGE,
+                InputFormat.DOCX,
+                InputFormat.HTML,
+                InputFormat.PPTX,
+                InputFormat.ASCIIDOC,
+                InputFormat.CSV,
+                InputFormat.MD,
+            ],  # whitelist formats, non-matching files are ignored.
+            format_options={
+                InputFormat.PDF: PdfFormatOption(
+                    pipeline_cls=StandardPdfPipeline, backend=PyPdfiumDocumentBackend
+                ),
+                InputFormat.DOCX: WordFormatOption(
+                    pipeline_cls=SimplePipeline  # , backend=MsWordDocumentBackend
+                ),
+            },
+        )
+    )
+
+
+def _build_html_converter():
+    return DocumentConverter()
+
+
+# Each profile names one set of format options and how to build a converter for it.
+CONVERTER_BUILDERS = {
+    DOCUMENT_PROFILE: _build_document_converter,
+    HTML_PROFILE: _build_html_converter,
+}
+
+# Formats whose pipelines are initialized ahead of time by warm_up().
+WARM_UP_FORMATS = {
+    DOCUMENT_PROFILE: [InputFormat.PDF, InputFormat.DOCX],
+    HTML_PROFILE: [InputFormat.HTML],
+}
+
+_converters = {}
+_lock = threading.Lock()
+
+
+def get_converter(profile: str = DOCUMENT_PROFILE) -> DocumentConverter:
+    """
+    Returns the shared converter for a profile, building it on first use.
+
+    Args:
+        profile (str, optional): Name of the converter profile. Defaults to DOCUMENT_PROFILE.
+
+    Returns:
+        DocumentConverter: The converter instance shared by every caller in this process.
+
+    Raises:
+        KeyError: If the profile is not registered in CONVERTER_BUILDERS.
+    """
+    converter = _converters.get(profile)
+    if converter is None:
+        with _lock:
+            converter = _converters.get(profile)
+            if converter is None:
+                converter = CONVERTER_BUILDERS[profile]()
+                _converters[profile] = converter
+    return converter
+
+
+def _qualified_name(cls) -> str:
+    return f"{cls.__module__}.{cls.__qualname__}" if cls is not None else None
+
+
+def describe_converter(profile: str = DOCUMENT_PROFILE) -> str:
+    """
+    Describes the configuration of a profile's converter: its allowed formats and, for
+    each format, the pipeline class, backend and pipeline options (OCR, tables, ...).
+
+    Returns:
+        str: A canonical JSON description, equal for equal configurations.
+    """
+    converter = get_converter(profile)
+    formats = {}
+    for input_format, option in converter.format_to_options.items():
+        pipeline_options = option.pipeline_options
+        formats[str(input_format.value)] = {
+            'pipeline': _qualified_name(option.pipeline_cls),
+            'backend': _qualified_name(option.backend),
+            'options': pipeline_options.model_dump() if pipeline_options is not None else None,
+        }
+    description = {
+        'allowed_formats': sorted(str(input_format.value) for input_format in converter.allowed_formats),
+        'formats': formats,
+    }
+    return json.dumps(description, sort_keys=True, default=str)
+
+
+def warm_up(profiles: list = None):
+    """
+    Builds the converters for the given profiles and initializes their pipelines, so
+    that model loading happens once at process start instead of on the first file.
+
+    Args:
+        profiles (list[str], optional): Profiles to warm. Defaults to all registered profiles.
+    """
+    for profile in profiles or CONVERTER_BUILDERS:
+        converter = get_converter(profile)
+        for input_format in WARM_UP_FORMATS.get(profile, []):
+            try:
+                converter.initialize_pipeline(input_format)
+            except Exception as e:
+                _log.error(f"Failed to warm up {input_format} pipeline for '{profile}'. Error: {e}")
@@ -1,43 +1,268 @@
 import logging
-from docling.backend.pypdfium2_backend import PyPdfiumDocumentBackend
-from docling.datamodel.base_models import InputFormat
-from docling.document_converter import (
-    DocumentConverter,
-    PdfFormatOption,
-    WordFormatOption,
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import NamedTuple
+import pypdfium2 as pdfium
+from docling.document_converter import DocumentConverter
+from docling_core.types.doc import DoclingDocument, TableItem, TextItem
+from ingestion.extractor.converter_registry import DOCUMENT_PROFILE, get_converter, warm_up
+from ingestion.extractor.extraction_cache import (
+    extraction_cache_key,
+    load_cached_extraction,
+    save_cached_extraction,
 )
-from docling.pipeline.simple_pipeline import SimplePipeline
-from docling.pipeline.standard_pdf_pipeline import StandardPdfPipeline
+from ingestion.extractor.pdf_extractor import (
+    MAX_IMAGE_COVERAGE,
+    MIN_TEXT_LAYER_CHARS,
+    TEXT_LAYER_PIPELINE,
+    classify_pdf_pages,
+    full_pipeline_ranges,
+)
+from ingestion.extractor.text_extractor import FAST_PATH_READERS
+from ingestion.manifest import hash_file
 
 _log = logging.getLogger(__name__)
 
-def extract_to(input_doc_path: str):
-    doc_converter = (
-        DocumentConverter(  # all of the below is optional, has internal defaults.
-            allowed_formats=[
-                InputFormat.PDF,
-                InputFormat.IMAGE,
-                InputFormat.DOCX,
-                InputFormat.HTML,
-                InputFormat.PPTX,
-                InputFormat.ASCIIDOC,
-                InputFormat.CSV,
-                InputFormat.MD,
-            ],  # whitelist formats, non-matching files are ignored.
-            format_options={
-                InputFormat.PDF: PdfFormatOption(
-                    pipeline_cls=StandardPdfPipeline, backend=PyPdfiumDocumentBackend
-                ),
-                InputFormat.DOCX: WordFormatOption(
-                    pipeline_cls=SimplePipeline  # , backend=MsWordDocumentBackend
-                ),
-            },
-        )
+PAGE_DELIMITER = "\n\n"
+
+
+class ExtractionResult(NamedTuple):
+    """
+    Result of extract_to. Read fields by name: positional unpacking needs all five.
+
+    page_spans holds (char_offset, page_no) pairs, in text order, marking where each
+    page starts in doc_text. It is empty for formats without pages.
+
+    page_pipelines holds (page_no, pipeline) pairs reporting which pipeline produced
+    each page in adaptive PDF mode. It is empty otherwise.
+
+    document is the structured docling document when the file was converted as a
+    whole, and None for fast-path, sharded and adaptive extractions.
+    """
+    doc_filename: str
+    doc_text: str
+    page_spans: tuple = ()
+    page_pipelines: tuple = ()
+    document: DoclingDocument = None
+
+
+def init_worker():
+    """
+    Initializer for extraction pool workers.
+
+    Warms the shared converters once per worker process so that every file handled
+    by the worker reuses the same loaded pipelines.
+    """
+    warm_up([DOCUMENT_PROFILE])
+
+
+def get_pdf_page_count(input_doc_path: str) -> int:
+    """
+    Returns the number of pages of a PDF without converting it.
+    """
+    pdf = pdfium.PdfDocument(input_doc_path)
+    try:
+        return len(pdf)
+    finally:
+        pdf.close()
+
+
+def _stitch_pages(page_texts: list) -> tuple:
+    """
+    Joins (page_no, text) pairs in page order and records where each page starts.
+
+    Returns:
+        tuple[str, tuple]: The joined text and its (char_offset, page_no) spans.
+    """
+    parts = []
+    page_spans = []
+    offset = 0
+    for page_no, text in sorted(page_texts):
+        if not text:
+            continue
+        if parts:
+            parts.append(PAGE_DELIMITER)
+            offset += len(PAGE_DELIMITER)
+        page_spans.append((offset, page_no))
+        parts.append(text)
+        offset += len(text)
+    return "".join(parts), tuple(page_spans)
+
+
+def _export_pages(document) -> list:
+    """
+    Exports the text of every page of a converted document as (page_no, text) pairs.
+
+    Walks the document tree once and groups element texts by the page of their first
+    provenance, instead of exporting (and re-walking the tree) once per page.
+    """
+    page_parts = {page_no: [] for page_no in document.pages}
+    for item, _ in document.iterate_items():
+        if isinstance(item, TableItem):
+            text = item.export_to_markdown(doc=document)
+        elif isinstance(item, TextItem):
+            text = item.text
+        else:
+            continue
+        if not text or not getattr(item, 'prov', None):
+            continue
+        page_parts.setdefault(item.prov[0].page_no, []).append(text)
+    return [(page_no, PAGE_DELIMITER.join(parts)) for page_no, parts in sorted(page_parts.items())]
+
+
+def _convert_page_range(input_doc_path: str, page_range: tuple) -> list:
+    """
+    Converts one page range of a PDF. Runs inside an extraction pool worker.
+
+    Returns:
+        list[tuple[int, str]]: The (page_no, text) pairs of the converted pages.
+    """
+    conv_result = get_converter(DOCUMENT_PROFILE).convert(input_doc_path, page_range=page_range)
+    return _export_pages(conv_result.document)
+
+
+def _extract_sharded(input_doc_path: str, page_count: int, pages_per_shard: int, max_workers: int = None):
+    """
+    Converts a PDF as concurrent page-range shards and stitches the text back in page order.
+    """
+    page_ranges = [
+        (start, min(start + pages_per_shard - 1, page_count))
+        for start in range(1, page_count + 1, pages_per_shard)
+    ]
+    _log.info(f"Extracting {input_doc_path} as {len(page_ranges)} shards of {pages_per_shard} pages.")
+
+    page_texts = []
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=init_worker) as executor:
+        futures = [executor.submit(_convert_page_range, input_doc_path, page_range) for page_range in page_ranges]
+        for future in futures:
+            page_texts.extend(future.result())
+
+    doc_text, page_spans = _stitch_pages(page_texts)
+    return ExtractionResult(Path(input_doc_path).name, doc_text, page_spans)
+
+
+def _extract_adaptive(input_doc_path: str, doc_converter: DocumentConverter):
+    """
+    Extracts born-digital PDF pages from their text layer and converts only the
+    remaining (scanned or image-heavy) pages with the full pipeline.
+    """
+    pages = classify_pdf_pages(input_doc_path)
+    page_texts = [(page_no, text) for page_no, pipeline, text in pages if pipeline == TEXT_LAYER_PIPELINE]
+    page_ranges = full_pipeline_ranges(pages)
+    for page_range in page_ranges:
+        conv_result = doc_converter.convert(input_doc_path, page_range=page_range)
+        page_texts.extend(_export_pages(conv_result.document))
+
+    _log.info(
+        f"{input_doc_path}: {len(pages) - sum(end - start + 1 for start, end in page_ranges)} "
+        f"of {len(pages)} pages extracted from the text layer."
     )
+    doc_text, page_spans = _stitch_pages(page_texts)
+    page_pipelines = tuple((page_no, pipeline) for page_no, pipeline, _ in pages)
+    return ExtractionResult(Path(input_doc_path).name, doc_text, page_spans, page_pipelines)
+
+
+def extract_to(
+    input_doc_path: str,
+    doc_converter: DocumentConverter = None,
+    pages_per_shard: int = None,
+    max_workers: int = None,
+    use_cache: bool = True,
+    adaptive_pdf: bool = False,
+):
+    """
+    Converts a document and exports its text content.
+
+    PDFs longer than pages_per_shard are split into page ranges which are converted
+    concurrently across worker processes and stitched back together in page order.
+
+    Plain-text-like formats (text, Markdown, CSV) are read directly and never reach
+    docling. Other results are cached on disk by file content and converter
+    configuration, so converting the same document again is a cache read.
+
+    In adaptive PDF mode, pages with a usable text layer skip the layout, OCR and
+    table models entirely. Only scanned or image-heavy pages take the full pipeline.
+
+    Args:
+        input_doc_path (str): Path of the document to convert.
+        doc_converter (DocumentConverter, optional): Converter to use. Defaults to the
+                                                     shared converter from the registry.
+        pages_per_shard (int, optional): Maximum number of PDF pages per shard. Defaults to
+                                         None, which converts the document as one unit.
+        max_workers (int, optional): Number of worker processes for sharded conversion.
+                                     Defaults to the CPU count.
+        use_cache (bool, optional): Read and write the extraction cache. Ignored when a custom
+                                    doc_converter is given. Defaults to True.
+        adaptive_pdf (bool, optional): Choose the pipeline per PDF page. Takes precedence over
+                                       pages_per_shard. Defaults to False.
+
+    Returns:
+        ExtractionResult: The document file name (with its extension, so report.pdf and
+                          report.docx stay distinct documents), its text, the
+                          character offsets at which each page starts, in adaptive
+                          PDF mode the pipeline used for each page, and the structured
+                          docling document when available.
+    """
+    fast_path_reader = FAST_PATH_READERS.get(Path(input_doc_path).suffix.lower())
+    if fast_path_reader is not None:
+        return ExtractionResult(Path(input_doc_path).name, fast_path_reader(input_doc_path))
+
+    is_pdf = Path(input_doc_path).suffix.lower() == ".pdf"
+    adaptive_pdf = adaptive_pdf and is_pdf
+
+    page_count = None
+    if pages_per_shard and is_pdf and not adaptive_pdf:
+        page_count = get_pdf_page_count(input_doc_path)
+    sharded = page_count is not None and page_count > pages_per_shard
+
+    # Each extraction mode caches under its own key: sharded and adaptive results
+    # carry no docling document, so they must not answer whole-document lookups.
+    cache_key = None
+    if use_cache and doc_converter is None:
+        if adaptive_pdf:
+            modes = [("adaptive", {'min_chars': MIN_TEXT_LAYER_CHARS, 'max_image_coverage': MAX_IMAGE_COVERAGE})]
+        elif sharded:
+            # A whole-document conversion, when cached, is at least as good as a sharded one.
+            modes = [("sharded", None), (None, None)]
+        else:
+            modes = [(None, None)]
+        file_hash = hash_file(input_doc_path)
+        cache_keys = [extraction_cache_key(input_doc_path, DOCUMENT_PROFILE, file_hash, mode, mode_options)
+                      for mode, mode_options in modes]
+        cache_key = cache_keys[0]
+        for key in cache_keys:
+            cached = load_cached_extraction(key)
+            if cached is not None:
+                page_spans = tuple(tuple(span) for span in cached['page_spans'])
+                page_pipelines = tuple(tuple(page) for page in cached.get('page_pipelines', ()))
+                document = DoclingDocument.model_validate(cached['document']) if cached.get('document') else None
+                return ExtractionResult(Path(input_doc_path).name, cached['doc_text'], page_spans, page_pipelines, document)
+
+    if adaptive_pdf:
+        result = _extract_adaptive(input_doc_path, doc_converter or get_converter(DOCUMENT_PROFILE))
+        if cache_key:
+            save_cached_extraction(cache_key, result.doc_text, result.page_spans,
+                                   page_pipelines=result.page_pipelines)
+        return result
+
+    if sharded:
+        result = _extract_sharded(input_doc_path, page_count, pages_per_shard, max_workers)
+        if cache_key:
+            save_cached_extraction(cache_key, result.doc_text, result.page_spans)
+        return result
+
+    if doc_converter is None:
+        doc_converter = get_converter(DOCUMENT_PROFILE)
 
     conv_result = doc_converter.convert(input_doc_path)
-    doc_filename = conv_result.input.file.stem
-    doc_text = conv_result.document.export_to_text()
+    doc_filename = conv_result.input.file.name
+    document = conv_result.document
+    if document.pages:
+        doc_text, page_spans = _stitch_pages(_export_pages(document))
+    else:
+        doc_text, page_spans = document.export_to_text(), ()
     # conv_result.document.export_to_markdown()
     # doc_text = conv_result.document.export_to_doctags()
-    return (doc_filename, doc_text)
\ No newline at end of file
+    if cache_key:
+        save_cached_extraction(cache_key, doc_text, page_spans, document)
+    return ExtractionResult(doc_filename, doc_text, page_spans, document=document)
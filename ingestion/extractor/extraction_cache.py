@@ -0,0 +1,89 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+from importlib.metadata import version
+from pathlib import Path
+from ingestion.extractor.converter_registry import describe_converter
+from ingestion.manifest import hash_file
+
+_log = logging.getLogger(__name__)
+
+EXTRACTION_CACHE_DIR = os.getenv('EXTRACTION_CACHE_DIR', 'data/cache/extraction')
+
+# Version of the text export done by document_extractor. Bump it whenever the export
+# changes, so entries written by the former export are no longer served.
+EXTRACTION_FORMAT_VERSION = 1
+
+
+def extraction_cache_key(input_doc_path: str, profile: str, file_hash: str = None, mode: str = None,
+                         mode_options: dict = None) -> str:
+    """
+    Builds the cache key of a document: its content hash plus everything that shapes
+    the output, namely the converter configuration (profile, format options and
+    docling version), the extraction mode and its options, and EXTRACTION_FORMAT_VERSION.
+    Pass file_hash when it is already known, to skip hashing the file again.
+    """
+    config = json.dumps({
+        'profile': profile,
+        'converter': describe_converter(profile),
+        'docling': version('docling'),
+        'format_version': EXTRACTION_FORMAT_VERSION,
+        'mode': mode,
+        'mode_options': mode_options,
+    }, sort_keys=True)
+    return hashlib.sha256(f"{file_hash or hash_file(input_doc_path)}:{config}".encode()).hexdigest()
+
+
+def _cache_path(cache_key: str) -> Path:
+    return Path(EXTRACTION_CACHE_DIR) / cache_key[:2] / f"{cache_key}.json.gz"
+
+
+def load_cached_extraction(cache_key: str):
+    """
+    Loads a cached extraction.
+
+    Returns:
+        dict: The cached entry with 'doc_text', 'page_spans', 'page_pipelines' and 'document'
+              (the docling document as a dict, or None), or None if the key is not cached.
+    """
+    cache_path = _cache_path(cache_key)
+    try:
+        with gzip.open(cache_path, 'rt', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, json.JSONDecodeError) as e:
+        _log.error(f"Ignoring unreadable extraction cache entry {cache_path}. Error: {e}")
+        return None
+
+
+def save_cached_extraction(cache_key: str, doc_text: str, page_spans: tuple, document=None, page_pipelines: tuple = ()):
+    """
+    Stores an extraction as gzip-compressed JSON. The file is written under a temporary
+    name and then renamed, so concurrent workers never read a partial entry.
+
+    Args:
+        cache_key (str): Key returned by extraction_cache_key().
+        doc_text (str): The exported document text.
+        page_spans (tuple): The (char_offset, page_no) page spans of doc_text.
+        document (DoclingDocument, optional): The structured docling document. Defaults to None.
+        page_pipelines (tuple, optional): The (page_no, pipeline) decisions of adaptive PDF
+                                          extraction. Defaults to ().
+    """
+    cache_path = _cache_path(cache_key)
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    entry = {
+        'doc_text': doc_text,
+        'page_spans': page_spans,
+        'page_pipelines': page_pipelines,
+        'document': document.export_to_dict() if document is not None else None,
+    }
+    tmp_path = cache_path.with_name(f"{cache_path.name}.{os.getpid()}.tmp")
+    try:
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+            json.dump(entry, f, separators=(',', ':'))
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        _log.error(f"Failed to write extraction cache entry {cache_path}. Error: {e}")
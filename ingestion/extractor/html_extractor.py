@@ -1,6 +1,6 @@
 import logging
 from urllib.parse import urlparse
-from docling.document_converter import DocumentConverter
+from ingestion.extractor.converter_registry import HTML_PROFILE, get_converter
 from utils.document_utils import get_sitemap_urls
 
 _log = logging.getLogger(__name__)
@@ -22,7 +22,7 @@ def get_site_content(url: str):
         return "Error: The provided URL is not valid."
 
     try:
-        converter = DocumentConverter()
+        converter = get_converter(HTML_PROFILE)
         result = converter.convert(url)
         document = result.document
         markdown_output = document.export_to_markdown()
@@ -51,7 +51,7 @@ def scrap_site_content(url: str):
         return "Error: The provided URL is not valid."
     try:
         sitemap_urls = get_sitemap_urls(url)
-        converter = DocumentConverter()
+        converter = get_converter(HTML_PROFILE)
         conv_results_iter = converter.convert_all(sitemap_urls)
 
         docs = []
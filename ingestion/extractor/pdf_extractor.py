@@ -0,0 +1,90 @@
+import pypdfium2 as pdfium
+import pypdfium2.raw as pdfium_c
+
+TEXT_LAYER_PIPELINE = "text_layer"
+FULL_PIPELINE = "full"
+
+# A page needs at least this many characters in its text layer to skip the full pipeline.
+MIN_TEXT_LAYER_CHARS = 100
+# Pages whose area is covered by images beyond this ratio always take the full pipeline.
+MAX_IMAGE_COVERAGE = 0.5
+
+
+def _image_coverage(page) -> float:
+    """
+    Returns the share of the page area covered by image objects.
+    """
+    page_area = page.get_width() * page.get_height()
+    if not page_area:
+        return 0.0
+    covered = 0.0
+    for image in page.get_objects(filter=[pdfium_c.FPDF_PAGEOBJ_IMAGE]):
+        left, bottom, right, top = image.get_pos()
+        covered += max(right - left, 0) * max(top - bottom, 0)
+    return min(covered / page_area, 1.0)
+
+
+def classify_pdf_pages(
+    input_doc_path: str,
+    min_chars: int = MIN_TEXT_LAYER_CHARS,
+    max_image_coverage: float = MAX_IMAGE_COVERAGE,
+) -> list:
+    """
+    Decides for every page of a PDF whether its embedded text layer can be used as is,
+    or whether it needs the full layout/OCR pipeline.
+
+    A page uses its text layer when it has at least min_chars of readable text and is
+    not dominated by images. Everything else (scanned or image-heavy pages) is sent
+    to the full pipeline.
+
+    Args:
+        input_doc_path (str): Path of the PDF.
+        min_chars (int, optional): Minimum number of text layer characters. Defaults to MIN_TEXT_LAYER_CHARS.
+        max_image_coverage (float, optional): Maximum share of the page covered by images.
+                                              Defaults to MAX_IMAGE_COVERAGE.
+
+    Returns:
+        list[tuple[int, str, str]]: (page_no, pipeline, text) for every page, with 1-based
+                                    page numbers. text is the text layer for pages using
+                                    TEXT_LAYER_PIPELINE and None otherwise.
+    """
+    pages = []
+    pdf = pdfium.PdfDocument(input_doc_path)
+    try:
+        for index in range(len(pdf)):
+            page = pdf[index]
+            textpage = page.get_textpage()
+            text = textpage.get_text_range().replace("\r\n", "\n").strip()
+            textpage.close()
+            coverage = _image_coverage(page)
+            page.close()
+
+            unreadable = text.count("�")
+            if len(text) - unreadable >= min_chars and coverage <= max_image_coverage:
+                pages.append((index + 1, TEXT_LAYER_PIPELINE, text))
+            else:
+                pages.append((index + 1, FULL_PIPELINE, None))
+    finally:
+        pdf.close()
+    return pages
+
+
+def full_pipeline_ranges(pages: list) -> list:
+    """
+    Groups the pages that need the full pipeline into contiguous (start, end) page ranges.
+
+    Args:
+        pages (list): The output of classify_pdf_pages().
+
+    Returns:
+        list[tuple[int, int]]: Inclusive, 1-based page ranges.
+    """
+    ranges = []
+    for page_no, pipeline, _ in pages:
+        if pipeline != FULL_PIPELINE:
+            continue
+        if ranges and ranges[-1][1] == page_no - 1:
+            ranges[-1] = (ranges[-1][0], page_no)
+        else:
+            ranges.append((page_no, page_no))
+    return ranges
@@ -0,0 +1,46 @@
+import csv
+import io
+
+
+def read_text_file(input_doc_path: str) -> str:
+    """
+    Reads a plain-text-like file (plain text, Markdown) in one call.
+
+    Args:
+        input_doc_path (str): Path of the file to read.
+
+    Returns:
+        str: The file content. Undecodable bytes are replaced rather than failing the file.
+    """
+    with open(input_doc_path, 'r', encoding='utf-8', errors='replace') as f:
+        return f.read()
+
+
+def read_csv_file(input_doc_path: str, delimiter: str = " | ") -> str:
+    """
+    Reads a CSV file row by row and renders it as text, one row per line.
+
+    Args:
+        input_doc_path (str): Path of the file to read.
+        delimiter (str, optional): Separator placed between cells. Defaults to " | ".
+
+    Returns:
+        str: The rendered rows, header first.
+    """
+    buffer = io.StringIO()
+    with open(input_doc_path, 'r', encoding='utf-8', errors='replace', newline='') as f:
+        for row in csv.reader(f):
+            if any(cell.strip() for cell in row):
+                buffer.write(delimiter.join(cell.strip() for cell in row))
+                buffer.write("\n")
+    return buffer.getvalue()
+
+
+# File suffixes that do not need layout analysis, mapped to their reader.
+FAST_PATH_READERS = {
+    '.txt': read_text_file,
+    '.text': read_text_file,
+    '.md': read_text_file,
+    '.markdown': read_text_file,
+    '.csv': read_csv_file,
+}
@@ -0,0 +1,88 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+
+MANIFEST_PATH = os.getenv('INGESTION_MANIFEST', 'data/ingestion_manifest.json')
+
+
+def hash_file(file_path: str, block_size: int = 1 << 20) -> str:
+    """
+    Computes the SHA-256 hash of a file's content, reading it in blocks.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_manifest(manifest_path: str = MANIFEST_PATH) -> dict:
+    """
+    Loads the ingestion manifest.
+
+    Returns:
+        dict: Mapping of file path to {'doc': str, 'size': int, 'mtime': float, 'hash': str}.
+              Empty if no manifest has been written yet.
+    """
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def save_manifest(manifest: dict, manifest_path: str = MANIFEST_PATH):
+    """
+    Writes the ingestion manifest atomically, so an interrupted run never leaves a
+    truncated file behind.
+    """
+    Path(manifest_path).parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = f"{manifest_path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+
+def diff_manifest(manifest: dict, doc_paths: list):
+    """
+    Compares the files on disk against the manifest.
+
+    A file whose size and mtime match its manifest entry is treated as unchanged
+    without being read. Otherwise its content hash decides. Entries recorded under a
+    document name other than the file name (earlier versions used the name without
+    extension) count as changed, so the file is re-ingested under its current name.
+
+    Args:
+        manifest (dict): The manifest returned by load_manifest().
+        doc_paths (list[str]): Paths of the documents currently on disk.
+
+    Returns:
+        tuple[dict, list]: A mapping of new or changed file path to its fresh manifest
+                           entry, and the list of manifest paths that no longer exist.
+    """
+    changed = {}
+    for doc_path in doc_paths:
+        stat = os.stat(doc_path)
+        entry = manifest.get(doc_path)
+        if entry and entry['doc'] != Path(doc_path).name:
+            entry = None
+        if entry and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime:
+            continue
+
+        content_hash = hash_file(doc_path)
+        if entry and entry['hash'] == content_hash:
+            # Touched but not modified, only the mtime needs refreshing.
+            entry['mtime'] = stat.st_mtime
+            continue
+
+        changed[doc_path] = {
+            'doc': Path(doc_path).name,
+            'size': stat.st_size,
+            'mtime': stat.st_mtime,
+            'hash': content_hash,
+        }
+
+    current = set(doc_paths)
+    deleted = [doc_path for doc_path in manifest if doc_path not in current]
+    return changed, deleted
@@ -0,0 +1,231 @@
+import asyncio
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from pathlib import Path
+from db_connector import (
+    content_hash, copy_embeddings_to_db, create_index, finish_ingestion_run, get_run_progress,
+    save_chunk_duplicates, start_ingestion_run,
+)
+from ingestion.dedup import ChunkDeduplicator
+from ingestion.document_ingestor import _extract_in_worker
+from ingestion.embedding_batch import EmbeddingBatch
+from ingestion.extractor.document_extractor import init_worker
+from ingestion.structured_chunker import iter_document_chunks
+from ingestion.vector import EMBEDDING_BATCH_SIZE, get_embeddings_ollama
+from utils.document_utils import get_document_filenames
+
+_log = logging.getLogger(__name__)
+
+# Marks the end of a stage's output on its queue.
+_DONE = object()
+
+
+async def _extract_stage(path_queue, doc_queue, executor, failed, **extract_kwargs):
+    loop = asyncio.get_running_loop()
+    while True:
+        doc_path = await path_queue.get()
+        if doc_path is _DONE:
+            return
+        _, data, error = await loop.run_in_executor(
+            executor, partial(_extract_in_worker, doc_path, **extract_kwargs)
+        )
+        if error:
+            _log.error(f"Failed to extract {doc_path}. Error: {error}")
+            failed.append({'doc': Path(doc_path).name})
+            continue
+        await doc_queue.put(data)
+
+
+async def _chunk_stage(doc_queue, chunk_queue, chunk_kwargs, deduplicator, persisted):
+    skipped = 0
+    while True:
+        data = await doc_queue.get()
+        if data is _DONE:
+            if skipped:
+                print(f"Skipped {skipped} chunks persisted by an earlier run.")
+            return
+        chunks = iter_document_chunks(data, **chunk_kwargs)
+        if deduplicator is not None:
+            chunks = deduplicator.filter(chunks)
+        for chunki in chunks:
+            # Deduplicate first, so a resumed run drops the same chunks as the original one.
+            key = (chunki['metadata_']['doc'], chunki['metadata_']['index'], content_hash(chunki['text']))
+            if key in persisted:
+                skipped += 1
+                continue
+            await chunk_queue.put(chunki)
+
+
+async def _embed_stage(chunk_queue, row_queue, batch_size, failed):
+    done = False
+    while not done:
+        # Wait for one chunk, then take whatever else is already queued, up to a batch.
+        # Stop at the first end marker, the others belong to the other embed workers.
+        batch = []
+        chunki = await chunk_queue.get()
+        while chunki is not _DONE:
+            batch.append(chunki)
+            if len(batch) >= batch_size or chunk_queue.empty():
+                break
+            chunki = chunk_queue.get_nowait()
+        done = chunki is _DONE
+        if not batch:
+            continue
+
+        embeddings = await asyncio.to_thread(
+            get_embeddings_ollama, [chunki['text'] for chunki in batch], batch_size=batch_size
+        )
+        for chunki, embedding in zip(batch, embeddings):
+            if embedding is None:
+                _log.error(f"Skipping chunk {chunki['metadata_']} without embedding.")
+                failed.append(chunki['metadata_'])
+        await row_queue.put(EmbeddingBatch.from_chunks(batch, embeddings))
+
+
+async def _insert_stage(row_queue, table_name, insert_batch_size, run_id):
+    inserted = 0
+    batches, pending = [], 0
+    while True:
+        batch = await row_queue.get()
+        if batch is not _DONE:
+            batches.append(batch)
+            pending += len(batch)
+        if pending and (batch is _DONE or pending >= insert_batch_size):
+            inserted += await asyncio.to_thread(
+                copy_embeddings_to_db, EmbeddingBatch.concat(batches), table_name, insert_batch_size, run_id
+            )
+            batches, pending = [], 0
+        if batch is _DONE:
+            return inserted
+
+
+async def _run_stage(workers: int, stage, output_queue, consumers: int, *args):
+    """
+    Runs a stage with the given number of workers, then tells each consumer of its
+    output queue that the stage is finished.
+    """
+    await asyncio.gather(*(stage(*args) for _ in range(workers)))
+    for _ in range(consumers):
+        await output_queue.put(_DONE)
+
+
+async def run_pipeline(
+    doc_paths: list,
+    extract_workers: int = 1,
+    embed_workers: int = 4,
+    embed_batch_size: int = EMBEDDING_BATCH_SIZE,
+    insert_batch_size: int = 256,
+    queue_size: int = 1024,
+    table_name: str = "embeddings_table",
+    pages_per_shard: int = None,
+    adaptive_pdf: bool = False,
+    chunk_kwargs: dict = None,
+    deduplicate: bool = True,
+    build_index: bool = False,
+    resume: bool = False,
+):
+    """
+    Streams documents through extraction, chunking, embedding and database insertion.
+
+    The stages are connected by bounded asyncio queues, so a slow stage applies
+    backpressure to the ones before it and memory stays flat regardless of corpus size.
+    Embedding starts as soon as the first document is chunked, overlapping with the
+    extraction of the remaining documents.
+
+    Every run is checkpointed: each inserted batch is committed together with its
+    ingestion_progress rows, and inserts skip chunks already stored. A run that dies,
+    or fails to extract a document or embed some chunks, is marked failed; run again with resume=True to
+    continue it, without re-embedding the chunks its progress rows record.
+
+    Args:
+        doc_paths (list[str]): Paths of the documents to ingest.
+        extract_workers (int, optional): Number of extraction worker processes. Defaults to 1.
+        embed_workers (int, optional): Number of concurrent embedding requests. Defaults to 4.
+        embed_batch_size (int, optional): Maximum number of chunks per embedding request.
+                                          Defaults to EMBEDDING_BATCH_SIZE.
+        insert_batch_size (int, optional): Number of rows per binary COPY into the database.
+                                           Defaults to 256.
+        queue_size (int, optional): Capacity, in chunks, of the chunk queue and of the queue
+                                    of embedded batches. Defaults to 1024.
+        table_name (str, optional): Table to insert into. Defaults to "embeddings_table".
+        pages_per_shard (int, optional): Split large PDFs into page-range shards of this many
+                                         pages. Only used with a single extraction worker.
+                                         Defaults to None.
+        adaptive_pdf (bool, optional): Only send scanned or image-heavy PDF pages through the
+                                       full layout/OCR pipeline. Defaults to False.
+        chunk_kwargs (dict, optional): Extra keyword arguments for iter_document_chunks, e.g.
+                                       {'structured': True, 'collection': 'acme'}. Defaults to None.
+        deduplicate (bool, optional): Drop duplicate chunks before embedding them. Near-duplicates
+                                      are only dropped when DEDUP_HAMMING_THRESHOLD is set.
+                                      Defaults to True.
+        build_index (bool, optional): Create the ANN index once all rows are loaded, rather
+                                      than maintaining it during the load. Defaults to False.
+        resume (bool, optional): Continue the last unfinished run, skipping the chunks it
+                                 already persisted. Defaults to False.
+
+    Returns:
+        int: The number of rows inserted.
+    """
+    path_queue = asyncio.Queue()
+    # Extracted documents are large, so only keep as many around as there are workers.
+    doc_queue = asyncio.Queue(maxsize=max(extract_workers, 1))
+    chunk_queue = asyncio.Queue(maxsize=queue_size)
+    row_queue = asyncio.Queue(maxsize=max(queue_size // embed_batch_size, 1))
+
+    for doc_path in doc_paths:
+        path_queue.put_nowait(doc_path)
+    for _ in range(extract_workers):
+        path_queue.put_nowait(_DONE)
+
+    extract_kwargs = {'adaptive_pdf': adaptive_pdf}
+    if extract_workers == 1:
+        extract_kwargs['pages_per_shard'] = pages_per_shard
+
+    deduplicator = ChunkDeduplicator() if deduplicate else None
+    run_id = await asyncio.to_thread(start_ingestion_run, table_name, resume)
+    persisted = await asyncio.to_thread(get_run_progress, run_id)
+    failed = []
+    try:
+        with ProcessPoolExecutor(max_workers=extract_workers, initializer=init_worker) as executor:
+            _, _, _, inserted = await asyncio.gather(
+                _run_stage(extract_workers, _extract_stage, doc_queue, 1,
+                           path_queue, doc_queue, executor, failed, **extract_kwargs),
+                _run_stage(1, _chunk_stage, chunk_queue, embed_workers,
+                           doc_queue, chunk_queue, chunk_kwargs or {}, deduplicator, persisted),
+                _run_stage(embed_workers, _embed_stage, row_queue, 1,
+                           chunk_queue, row_queue, embed_batch_size, failed),
+                _insert_stage(row_queue, table_name, insert_batch_size, run_id),
+            )
+    except BaseException:
+        await asyncio.to_thread(finish_ingestion_run, run_id, "failed")
+        raise
+    # Documents that could not be extracted and chunks that could not be embedded are
+    # missing, so leave the run for --resume to finish.
+    await asyncio.to_thread(finish_ingestion_run, run_id, "failed" if failed else "completed")
+    if failed:
+        failed_docs = sum(1 for entry in failed if 'index' not in entry)
+        print(f"Failed to extract {failed_docs} documents and to embed {len(failed) - failed_docs} chunks, "
+              f"resume run {run_id} to retry them.")
+    print(f"Pipeline inserted {inserted} rows from {len(doc_paths)} documents.")
+    if deduplicator is not None:
+        print(f"Skipped {len(deduplicator.duplicates)} duplicate chunks.")
+        await asyncio.to_thread(save_chunk_duplicates, deduplicator.duplicates)
+    if build_index and inserted:
+        await asyncio.to_thread(create_index, table_name)
+    return inserted
+
+
+async def stream_documents_to_db(**pipeline_kwargs):
+    """
+    Runs the streaming pipeline over every document in 'data/documents'.
+
+    Args:
+        **pipeline_kwargs: Keyword arguments forwarded to run_pipeline.
+
+    Returns:
+        int: The number of rows inserted.
+    """
+    data_folder = Path("data/documents")
+    doc_paths = [f"{data_folder}/{doc}" for doc in get_document_filenames()]
+    return await run_pipeline(doc_paths, **pipeline_kwargs)
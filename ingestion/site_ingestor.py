@@ -1,29 +1,40 @@
+from ingestion.dedup import SITE_DEDUP_HAMMING_THRESHOLD, ChunkDeduplicator
+from ingestion.embedding_batch import EmbeddingBatch
 from ingestion.extractor.html_extractor import get_site_content, scrap_site_content
-from ingestion.vector import get_embedding_ollama, chunk_text
+from ingestion.vector import get_embeddings_ollama, chunk_text
 
 
-def site_to_vector(url: str, sitemap: bool = False):
+def site_to_vector(url: str, sitemap: bool = False, deduplicate: bool = True, collection: str = None,
+                   duplicates: list = None):
     """
     Scrapes content from a URL, chunks it, and generates vector embeddings for each chunk.
 
     This function fetches content from a given URL. If a sitemap is specified, it will
     attempt to scrape content from all pages listed in the sitemap. Otherwise, it
     will scrape content from the single provided URL. The fetched content is then
-    broken down into smaller, overlapping chunks. Finally, it uses an Ollama-hosted
-    model to generate a vector embedding for each chunk.
+    broken down into smaller, overlapping chunks. Chunks repeated across pages (navigation,
+    footers, boilerplate) are dropped, and finally an Ollama-hosted model generates a
+    vector embedding for each remaining chunk.
 
     Args:
         url (str): The URL of the website or the sitemap to be processed.
         sitemap (bool, optional): If True, the function treats the URL as a sitemap
                                   and attempts to scrape all linked pages. If False,
                                   it only scrapes the single URL. Defaults to False.
+        deduplicate (bool, optional): Drop exact and near-duplicate chunks (within
+                                      SITE_DEDUP_HAMMING_THRESHOLD bits) before embedding
+                                      them. Defaults to True.
+        collection (str, optional): Collection (e.g. customer) the site belongs to, stored
+                                    with each chunk for filtered retrieval. Defaults to None.
+        duplicates (list, optional): Receives the metadata, 'duplicate_of' included, of every
+                                     dropped duplicate chunk, e.g. for save_chunk_duplicates.
+                                     Defaults to None.
 
     Returns:
-        list[dict]: A list of dictionaries, where each dictionary represents a chunk
-                    of the site's content with its corresponding vector embedding.
-                    The format is:
-                    [{'text': str, 'metadata_': {'doc': str, 'index': int}, 'embedding': list[float]}]
-        list: An empty list if no content could be retrieved from the URL(s).
+        EmbeddingBatch: The embedded chunks of the site's content, with the embeddings as
+                        one float32 matrix. Use EmbeddingBatch.to_chunks() for the former
+                        [{'text': str, 'metadata_': {'doc': str, 'index': int}, 'embedding': list[float]}]
+                        format. The batch is empty if no content could be retrieved from the URL(s).
     """
     chunks = []
     if sitemap:
@@ -32,10 +43,24 @@ def site_to_vector(url: str, sitemap: bool = False):
         site_content = get_site_content(url)
 
     if len(site_content) == 0:
-        return []
+        return EmbeddingBatch.empty()
 
-    chunks = chunk_text(site_content, url)
-    for chunki in chunks:
-        embedding = get_embedding_ollama(chunki['text'])
-        chunki['embedding'] = embedding
-    return chunks
\ No newline at end of file
+    # A sitemap yields one markdown document per page.
+    pages = site_content if isinstance(site_content, list) else [site_content]
+    chunks = []
+    for page_content in pages:
+        for chunki in chunk_text(page_content, url):
+            chunki['metadata_']['index'] = len(chunks)
+            chunki['metadata_']['source_type'] = 'site'
+            chunki['metadata_']['collection'] = collection
+            chunks.append(chunki)
+
+    if deduplicate:
+        deduplicator = ChunkDeduplicator(threshold=SITE_DEDUP_HAMMING_THRESHOLD)
+        chunks = list(deduplicator.filter(chunks))
+        print(f"Skipped {len(deduplicator.duplicates)} duplicate chunks.")
+        if duplicates is not None:
+            duplicates.extend(deduplicator.duplicates)
+
+    embeddings = get_embeddings_ollama([chunki['text'] for chunki in chunks])
+    return EmbeddingBatch.from_chunks(chunks, embeddings)
\ No newline at end of file
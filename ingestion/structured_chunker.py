@@ -0,0 +1,108 @@
+from docling_core.types.doc import DoclingDocument, SectionHeaderItem, TableItem, TextItem, TitleItem
+from ingestion.chunker import iter_chunks
+from utils.token_utils import count_tokens
+
+ELEMENT_DELIMITER = "\n\n"
+
+
+def _item_page(item):
+    return item.prov[0].page_no if getattr(item, 'prov', None) else None
+
+
+def iter_structured_chunks(document: DoclingDocument, doc_name: str, max_tokens: int = 512, overlap_tokens: int = 64):
+    """
+    Walks a docling document tree and packs whole elements (paragraphs, list items,
+    tables) into token-budgeted chunks that never cross a section boundary.
+
+    Elements larger than the budget on their own are split with the token chunker.
+    Every chunk carries the heading path of the section it belongs to.
+
+    Args:
+        document (DoclingDocument): The structured document returned by docling.
+        doc_name (str): The name or title of the document.
+        max_tokens (int, optional): Maximum number of tokens per chunk. Defaults to 512.
+        overlap_tokens (int, optional): Token overlap used when splitting oversized elements. Defaults to 64.
+
+    Yields:
+        dict: {'text': str, 'metadata_': {'doc': str, 'index': int, 'headings': list[str], 'page': int}}
+    """
+    headings = []
+    parts, part_tokens, part_page = [], 0, None
+    index = 0
+
+    def make_chunk(text, page):
+        nonlocal index
+        chunk = {
+            'text': text,
+            'metadata_': {'doc': doc_name, 'index': index, 'headings': [title for _, title in headings], 'page': page},
+        }
+        index += 1
+        return chunk
+
+    for item, _ in document.iterate_items():
+        if isinstance(item, (TitleItem, SectionHeaderItem)):
+            if parts:
+                yield make_chunk(ELEMENT_DELIMITER.join(parts), part_page)
+                parts, part_tokens, part_page = [], 0, None
+            level = item.level if isinstance(item, SectionHeaderItem) else 0
+            headings = [heading for heading in headings if heading[0] < level] + [(level, item.text)]
+            continue
+
+        if isinstance(item, TableItem):
+            text = item.export_to_markdown(doc=document)
+        elif isinstance(item, TextItem):
+            text = item.text
+        else:
+            continue
+        if not text.strip():
+            continue
+
+        tokens = count_tokens(text)
+        if parts and part_tokens + tokens > max_tokens:
+            yield make_chunk(ELEMENT_DELIMITER.join(parts), part_page)
+            parts, part_tokens, part_page = [], 0, None
+
+        if tokens > max_tokens:
+            for piece in iter_chunks(text, doc_name, max_tokens=max_tokens, overlap_tokens=overlap_tokens):
+                yield make_chunk(piece['text'], _item_page(item))
+            continue
+
+        if not parts:
+            part_page = _item_page(item)
+        parts.append(text)
+        part_tokens += tokens
+
+    if parts:
+        yield make_chunk(ELEMENT_DELIMITER.join(parts), part_page)
+
+
+def iter_document_chunks(data, structured: bool = False, max_tokens: int = 512, overlap_tokens: int = 64,
+                         collection: str = None):
+    """
+    Chunks an extraction result, from its document tree when requested and available,
+    otherwise from its text.
+
+    Args:
+        data (ExtractionResult): The result of extract_to.
+        structured (bool, optional): Chunk along the docling document structure. Results
+                                     without a document (plain text formats, sharded or
+                                     adaptive PDFs) fall back to token chunking. Defaults to False.
+        max_tokens (int, optional): Maximum number of tokens per chunk. Defaults to 512.
+        overlap_tokens (int, optional): Number of tokens shared by consecutive chunks. Defaults to 64.
+        collection (str, optional): Collection (e.g. customer) the document belongs to, stored
+                                    with each chunk for filtered retrieval. Defaults to None.
+
+    Yields:
+        dict: Chunks in the format of ingestion.chunker.iter_chunks, with 'source_type'
+              set to 'document' and 'collection' in their metadata.
+    """
+    if structured and data.document is not None:
+        chunks = iter_structured_chunks(data.document, data.doc_filename, max_tokens, overlap_tokens)
+    elif data.doc_text:
+        chunks = iter_chunks(data.doc_text, data.doc_filename, max_tokens, overlap_tokens, page_spans=data.page_spans)
+    else:
+        return
+    for chunki in chunks:
+        chunki['metadata_']['source_type'] = 'document'
+        chunki['metadata_']['collection'] = collection
+        yield chunki
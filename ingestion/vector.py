@@ -1,25 +1,42 @@
+import asyncio
 import os
+import time
 import ollama
 from dotenv import load_dotenv
+from ingestion.chunker import iter_chunks
+from utils.embedding_cache import get_embedding_cache
+from utils.embedding_scheduler import EmbeddingScheduler
 
 load_dotenv()
 
 EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL')
+EMBEDDING_BATCH_SIZE = int(os.getenv('EMBEDDING_BATCH_SIZE', 32))
 
-def chunk_text(text, doc_name, chunk_size=500, overlap=100):
+_scheduler = EmbeddingScheduler()
+_async_client = None
+
+def chunk_text(text, doc_name, chunk_size=512, overlap=64, page_spans=None):
     """
     Splits a given text into smaller chunks for embedding, with metadata.
 
+    Chunks are measured in embedding model tokens, so no chunk exceeds the model
+    context, and are cut at character offsets of the source text. See
+    ingestion.chunker.iter_chunks for a lazy version.
+
     Args:
         text (str): The input text to be chunked.
         doc_name (str): The name or title of the document the text belongs to.
-        chunk_size (int, optional): The maximum size of each text chunk in words. Defaults to 500.
-        overlap (int, optional): The number of words to overlap between consecutive chunks. Defaults to 100.
+        chunk_size (int, optional): The maximum size of each text chunk in tokens. Defaults to 512.
+        overlap (int, optional): The number of tokens to overlap between consecutive chunks. Defaults to 64.
+        page_spans (tuple, optional): (char_offset, page_no) pairs marking where each page
+                                      starts in the text. When given, the page a chunk
+                                      starts on is added to its metadata. Defaults to None.
 
     Returns:
         list[dict]: A list of dictionaries, where each dictionary represents a chunk.
                     Each dictionary contains the chunked text and its associated metadata.
-                    The format is: [{'text': str, 'metadata_': {'doc': str, 'index': int}}]
+                    The format is: [{'text': str, 'metadata_': {'doc': str, 'index': int, 'start': int, 'end': int}}],
+                    with an additional 'page' metadata key when page_spans is given.
     """
     if text == "":
         print("No text for embedding.")
@@ -27,17 +44,8 @@ def chunk_text(text, doc_name, chunk_size=500, overlap=100):
     if doc_name == "":
         print("No document title for embedding.")
         return []
-    
-    words = text.split()
-    chunks = []
-
-    for i in range(0, len(words), chunk_size - overlap):
-        chunk = " ".join(words[i:i + chunk_size])
-        chunks.append({
-            'text': chunk,
-            'metadata_': {'doc': doc_name, 'index': i}
-        })
-    return chunks
+
+    return list(iter_chunks(text, doc_name, max_tokens=chunk_size, overlap_tokens=overlap, page_spans=page_spans))
 
 def get_embedding_ollama(text: str, model: str=EMBEDDING_MODEL):
     """
@@ -52,15 +60,80 @@ def get_embedding_ollama(text: str, model: str=EMBEDDING_MODEL):
                                Defaults to "nomic-embed-text:latest".
 
     Returns:
-        list[float]: A list of floats representing the embedding vector for the text.
-    
-    Raises:
-        requests.exceptions.RequestException: If there is an issue connecting to the Ollama server.
-        KeyError: If the 'embedding' key is not present in the Ollama response.
+        list[float]: A list of floats representing the embedding vector for the text, or
+                     None if the request to the Ollama server failed.
+    """
+    return get_embeddings_ollama([text], model=model)[0]
+
+async def aget_embedding_ollama(text: str, model: str=EMBEDDING_MODEL):
+    """
+    Async version of get_embedding_ollama, for callers running in an event loop.
+
+    Uses a shared ollama.AsyncClient, so concurrent questions do not block each other
+    while waiting for the Ollama server. Embedding cache reads and writes run in a
+    worker thread, as they hit SQLite and wait for the lock shared with ingestion.
+
+    Args:
+        text (str): The text to be embedded.
+        model (str, optional): The name of the Ollama model to use for embedding.
+                               Defaults to the EMBEDDING_MODEL environment variable.
+
+    Returns:
+        list[float]: The embedding vector for the text, or None if the request to the
+                     Ollama server failed.
     """
+    global _async_client
+    cache = await asyncio.to_thread(get_embedding_cache)
+    if cache:
+        embedding = (await asyncio.to_thread(cache.get_many, model, 0, [text]))[0]
+        if embedding is not None:
+            return embedding
+
+    if _async_client is None:
+        _async_client = ollama.AsyncClient()
     try:
-        response = ollama.embeddings(model=model, prompt=text)
-        return response["embedding"]
+        response = await _async_client.embed(model=model, input=[text])
     except Exception as e:
-        print(f"Error getting embedding from Ollama: {e}")
-        return None
\ No newline at end of file
+        print(f"Error getting embeddings from Ollama: {e}")
+        return None
+    if cache:
+        await asyncio.to_thread(cache.put_many, model, 0, [text], response["embeddings"])
+    return response["embeddings"][0]
+
+def get_embeddings_ollama(texts: list, model: str=EMBEDDING_MODEL, batch_size: int=EMBEDDING_BATCH_SIZE):
+    """
+    Generates vector embeddings for many texts using Ollama's multi-input /api/embed endpoint.
+
+    Texts are grouped into requests of similar token length by an EmbeddingScheduler,
+    whose token budget adapts to the observed request latency, with at most batch_size
+    texts per request. Texts already in the persistent embedding cache are not sent at all.
+
+    Args:
+        texts (list[str]): The texts to be embedded.
+        model (str, optional): The name of the Ollama model to use for embedding.
+                               Defaults to the EMBEDDING_MODEL environment variable.
+        batch_size (int, optional): Maximum number of texts per request. Defaults to EMBEDDING_BATCH_SIZE.
+
+    Returns:
+        list[list[float]]: The embedding vectors, in the same order as texts. Entries of
+                           a request that failed are None.
+    """
+    cache = get_embedding_cache()
+    embeddings = cache.get_many(model, 0, texts) if cache else [None] * len(texts)
+    missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+
+    missing_texts = [texts[i] for i in missing]
+    for batch, padded_tokens in _scheduler.plan(missing_texts, max_batch_size=batch_size):
+        batch_texts = [missing_texts[i] for i in batch]
+        started = time.perf_counter()
+        try:
+            response = ollama.embed(model=model, input=batch_texts)
+        except Exception as e:
+            print(f"Error getting embeddings from Ollama: {e}")
+            continue
+        _scheduler.record(padded_tokens, time.perf_counter() - started)
+        for i, embedding in zip(batch, response["embeddings"]):
+            embeddings[missing[i]] = embedding
+        if cache:
+            cache.put_many(model, 0, batch_texts, response["embeddings"])
+    return embeddings
\ No newline at end of file
@@ -138,6 +138,9 @@ async def main():
         except Exception as e:
             print(f"[Error] {e}")
 
+    await graphiti.close()
+    await graphiti.embedder.aclose()
+
 if __name__ == "__main__":
     try:
         asyncio.run(main())
@@ -6,8 +6,8 @@ from ollama import chat
 from colorama import Fore, Style
 from utils.ollama_utils import check_if_model_exist
 from utils.decorators import timer_decorator
-from db_connector import get_top_k_similar_docs, check_db_connection
-from ingestion.vector import get_embedding_ollama
+from db_connector import aget_top_k_similar_docs, aget_top_k_similar_docs_compact, aget_top_k_hybrid_docs, aclose_async_pool, check_db_connection, compact_index_name, prewarm_index
+from ingestion.vector import aget_embedding_ollama
 
 load_dotenv()
 
@@ -15,6 +15,10 @@ AI_MODEL = os.getenv('AI_MODEL')
 POSTGRES_PASSWORD = os.getenv('POSTGRES_PASSWORD')
 POSTGRES_PORT = os.getenv('POSTGRES_PORT')
 EMBEDDING_MODEL = "nomic-embed-text:latest"
+# Fuse full-text and vector search, so exact identifiers in the question are found.
+HYBRID_RETRIEVAL = os.getenv('HYBRID_RETRIEVAL', 'false').lower() == 'true'
+# Search a compact (halfvec or binary) index and re-score exactly, see create_compact_index.
+COMPACT_INDEX_PRECISION = os.getenv('COMPACT_INDEX_PRECISION')
 
 def get_completion_from_messages(messages: List[Dict[str, Any]], model: str = AI_MODEL, temperature: float = 0, max_tokens: int = 1000) -> str:
     """
@@ -58,8 +62,13 @@ async def process_input_with_retrieval(user_input: str) -> str:
     Processes the user's input by retrieving relevant documents and generating a response.
     """
     # Step 1: Get documents related to the user input from the database
-    query_embedding = get_embedding_ollama(user_input)
-    related_docs = get_top_k_similar_docs(query_embedding)
+    query_embedding = await aget_embedding_ollama(user_input)
+    if HYBRID_RETRIEVAL:
+        related_docs = await aget_top_k_hybrid_docs(query_embedding, user_input)
+    elif COMPACT_INDEX_PRECISION:
+        related_docs = await aget_top_k_similar_docs_compact(query_embedding)
+    else:
+        related_docs = await aget_top_k_similar_docs(query_embedding)
 
     # Step 2: Format messages to pass to the model for RAG
     delimiter = "```"
@@ -86,7 +95,7 @@ async def process_input_with_retrieval(user_input: str) -> str:
         {"role": "user", "content": user_message},
     ]
 
-    final_response = get_completion_from_messages(messages)
+    final_response = await asyncio.to_thread(get_completion_from_messages, messages)
     return final_response
 
 async def main():
@@ -95,6 +104,15 @@ async def main():
     
     if check_db_connection() == False:
         return
+
+    # Prewarm the indexes the configured retrieval actually searches.
+    if HYBRID_RETRIEVAL:
+        prewarm_index("embedding_idx")
+        prewarm_index("embeddings_table_text_search_idx")
+    elif COMPACT_INDEX_PRECISION:
+        prewarm_index(compact_index_name())
+    else:
+        prewarm_index("embedding_idx")
     
     print("Ollama Agent. Type 'exit' or 'quit' to terminate running task.")
     while True:
@@ -114,6 +132,8 @@ async def main():
         except Exception as e:
             print(f"[Error] {e}")
 
+    await aclose_async_pool()
+
 if __name__ == "__main__":
     try:
         asyncio.run(main())
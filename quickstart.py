@@ -241,6 +241,7 @@ async def main():
 
         # Close the connection
         await graphiti.close()
+        await graphiti.embedder.aclose()
         print('\nConnection closed')
 
 
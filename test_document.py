@@ -1,16 +1,36 @@
+import argparse
 import asyncio
-from ingestion.document_ingestor import doc_to_vector
-from db_connector import insert_embeddings_to_db
+from ingestion.document_ingestor import doc_to_vector, sync_documents
+from ingestion.pipeline import stream_documents_to_db
+from db_connector import insert_embeddings_to_db, create_index, ensure_embedding_schema, save_chunk_duplicates
 from utils.decorators import timer_decorator
 
 
 
 @timer_decorator
-async def execute_conversion():  
+async def execute_conversion(incremental: bool = False, stream: bool = False, resume: bool = False):  
     print('start conversion') 
-    embedded_text = doc_to_vector()
-    print(embedded_text)
+    ensure_embedding_schema()
+    if incremental:
+        sync_documents()
+        return
+    if stream or resume:
+        await stream_documents_to_db(build_index=True, resume=resume)
+        return
+    duplicates = []
+    embedded_text = doc_to_vector(duplicates=duplicates)
+    print(f"Embedded {len(embedded_text)} chunks.")
     insert_embeddings_to_db(embedded_text)
+    save_chunk_duplicates(duplicates)
+    create_index()
 
 if __name__ == "__main__":
-    asyncio.run(execute_conversion())
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Ingest the documents in data/documents.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only re-ingest new or changed documents and drop deleted ones.")
+    parser.add_argument("--stream", action="store_true",
+                        help="Stream documents through extraction, embedding and insertion.")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue the last interrupted streaming run, skipping chunks already stored.")
+    args = parser.parse_args()
+    asyncio.run(execute_conversion(args.incremental, args.stream, args.resume))
\ No newline at end of file
@@ -0,0 +1,34 @@
+from ingestion.chunker import iter_chunks, page_at
+from utils.token_utils import count_tokens
+
+
+TEXT = " ".join(f"word{i} ends, here." for i in range(200))
+
+
+def test_chunks_are_slices_of_the_source_text():
+    chunks = list(iter_chunks(TEXT, 'report.pdf', max_tokens=40, overlap_tokens=8))
+
+    assert len(chunks) > 1
+    for index, chunk in enumerate(chunks):
+        metadata = chunk['metadata_']
+        assert metadata['index'] == index
+        assert chunk['text'] == TEXT[metadata['start']:metadata['end']]
+        assert count_tokens(chunk['text']) <= 40
+    assert chunks[0]['metadata_']['start'] == 0
+    assert chunks[-1]['metadata_']['end'] == len(TEXT)
+
+
+def test_consecutive_chunks_overlap_and_start_on_a_word():
+    chunks = list(iter_chunks(TEXT, 'report.pdf', max_tokens=40, overlap_tokens=8))
+
+    for previous, chunk in zip(chunks, chunks[1:]):
+        start = chunk['metadata_']['start']
+        assert previous['metadata_']['start'] < start < previous['metadata_']['end']
+        assert not (TEXT[start - 1].isalnum() and TEXT[start].isalnum())
+
+
+def test_page_at_maps_offsets_to_the_page_they_fall_on():
+    page_spans = ((0, 1), (100, 2), (250, 4))
+
+    assert [page_at(page_spans, offset) for offset in (0, 99, 100, 249, 1000)] == [1, 1, 2, 2, 4]
+    assert page_at((), 10) is None
@@ -0,0 +1,49 @@
+import json
+import struct
+import numpy as np
+from psycopg2.extras import Json
+from db_connector import _COPY_HEADER, _COPY_TRAILER, _iter_copy_data
+
+
+def _read_fields(tuple_data):
+    field_count, = struct.unpack_from("!h", tuple_data)
+    offset = 2
+    fields = []
+    for _ in range(field_count):
+        size, = struct.unpack_from("!i", tuple_data, offset)
+        offset += 4
+        if size == -1:
+            fields.append(None)
+            continue
+        fields.append(tuple_data[offset:offset + size])
+        offset += size
+    assert offset == len(tuple_data)
+    return fields
+
+
+def test_copy_data_is_framed_by_header_and_trailer():
+    parts = list(_iter_copy_data([]))
+
+    assert parts == [_COPY_HEADER, _COPY_TRAILER]
+    assert _COPY_HEADER == b"PGCOPY\n\xff\r\n\x00" + b"\x00" * 8
+    assert _COPY_TRAILER == b"\xff\xff"
+
+
+def test_copy_row_encodes_every_column_in_binary_format():
+    row = ("chunk text", "report.pdf", 7, np.array([0.5, -1.0, 2.25]), None, "acme",
+           "0123456789abcdef0123456789abcdef", Json({'page': 3}))
+
+    _, tuple_data, _ = _iter_copy_data([row])
+    text, doc_name, doc_index, embedding, source_type, collection, text_hash, metadata = _read_fields(tuple_data)
+
+    assert text == b"chunk text"
+    assert doc_name == b"report.pdf"
+    assert struct.unpack("!i", doc_index) == (7,)
+    dimensions, unused = struct.unpack_from("!HH", embedding)
+    assert (dimensions, unused) == (3, 0)
+    assert np.frombuffer(embedding[4:], dtype=">f4").tolist() == [0.5, -1.0, 2.25]
+    assert source_type is None
+    assert collection == b"acme"
+    assert text_hash == b"0123456789abcdef0123456789abcdef"
+    assert metadata[:1] == b"\x01"
+    assert json.loads(metadata[1:]) == {'page': 3}
@@ -0,0 +1,38 @@
+from ingestion.dedup import ChunkDeduplicator
+
+
+def _chunk(text, doc, index):
+    return {'text': text, 'metadata_': {'doc': doc, 'index': index}}
+
+
+def test_exact_copy_of_near_duplicate_points_at_canonical_chunk():
+    base = "the quarterly revenue grew by twelve percent driven by strong demand in the retail segment"
+    near = base + " overall"
+    deduplicator = ChunkDeduplicator(threshold=10)
+
+    kept = list(deduplicator.filter([
+        _chunk(base, 'x', 0),
+        _chunk(near, 'x', 1),
+        _chunk(near, 'y', 0),
+    ]))
+
+    assert [chunk['metadata_']['index'] for chunk in kept] == [0]
+    assert [duplicate['duplicate_of'] for duplicate in deduplicator.duplicates] == [
+        {'doc': 'x', 'index': 0},
+        {'doc': 'x', 'index': 0},
+    ]
+
+
+def test_zero_threshold_keeps_near_duplicates_and_drops_exact_copies():
+    statement = "total assets at the end of the period amounted to 1 204 500 euros for the holding account"
+    other_period = statement.replace("1 204 500", "1 207 900")
+    deduplicator = ChunkDeduplicator(threshold=0)
+
+    kept = list(deduplicator.filter([
+        _chunk(statement, 'x', 0),
+        _chunk(other_period, 'x', 1),
+        _chunk(statement, 'y', 0),
+    ]))
+
+    assert [chunk['metadata_']['index'] for chunk in kept] == [0, 1]
+    assert [duplicate['duplicate_of'] for duplicate in deduplicator.duplicates] == [{'doc': 'x', 'index': 0}]
@@ -0,0 +1,41 @@
+from utils.embedding_scheduler import EmbeddingScheduler
+
+
+def _text(tokens):
+    return " ".join(["word"] * tokens)
+
+
+def test_plan_groups_inputs_by_length_bucket_within_the_budget():
+    texts = [_text(3), _text(100), _text(4), _text(120), _text(2), _text(1000)]
+    scheduler = EmbeddingScheduler(token_budget=256)
+
+    plan = scheduler.plan(texts)
+
+    assert sorted(i for batch, _ in plan for i in batch) == list(range(len(texts)))
+    assert plan == [
+        ([4], 2),
+        ([0, 2], 8),
+        ([1, 3], 256),
+        ([5], 1024),
+    ]
+
+
+def test_plan_respects_the_batch_size_cap():
+    texts = [_text(4)] * 10
+    scheduler = EmbeddingScheduler(token_budget=4096, max_batch_size=8)
+
+    assert [batch for batch, _ in scheduler.plan(texts, max_batch_size=3)] == [
+        [0, 1, 2], [3, 4, 5], [6, 7, 8], [9],
+    ]
+    assert [len(batch) for batch, _ in scheduler.plan(texts, max_batch_size=50)] == [8, 2]
+
+
+def test_record_moves_the_budget_towards_the_target_latency():
+    scheduler = EmbeddingScheduler(token_budget=8192, target_latency=2.0)
+
+    scheduler.record(8192, 8.0)
+    assert scheduler.token_budget < 8192
+
+    shrunk = scheduler.token_budget
+    scheduler.record(shrunk, 0.5)
+    assert scheduler.token_budget > shrunk
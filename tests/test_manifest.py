@@ -0,0 +1,52 @@
+import os
+from pathlib import Path
+from ingestion.manifest import diff_manifest, hash_file
+
+
+def _write(path, content, mtime=1_000_000):
+    path.write_text(content)
+    os.utime(path, (mtime, mtime))
+    return str(path)
+
+
+def _entry(doc_path):
+    stat = os.stat(doc_path)
+    return {'doc': Path(doc_path).name, 'size': stat.st_size, 'mtime': stat.st_mtime, 'hash': hash_file(doc_path)}
+
+
+def test_new_changed_and_deleted_files(tmp_path):
+    unchanged = _write(tmp_path / "unchanged.pdf", "same")
+    changed = _write(tmp_path / "changed.pdf", "before")
+    manifest = {
+        unchanged: _entry(unchanged),
+        changed: _entry(changed),
+        str(tmp_path / "gone.pdf"): {'doc': "gone.pdf", 'size': 1, 'mtime': 1.0, 'hash': "x"},
+    }
+    _write(tmp_path / "changed.pdf", "after!", mtime=2_000_000)
+    new = _write(tmp_path / "new.docx", "new")
+
+    changed_entries, deleted = diff_manifest(manifest, [unchanged, changed, new])
+
+    assert sorted(changed_entries) == sorted([changed, new])
+    assert changed_entries[new] == _entry(new)
+    assert deleted == [str(tmp_path / "gone.pdf")]
+
+
+def test_touched_file_only_refreshes_its_mtime(tmp_path):
+    doc_path = _write(tmp_path / "report.pdf", "content")
+    manifest = {doc_path: _entry(doc_path)}
+    os.utime(doc_path, (3_000_000, 3_000_000))
+
+    changed, deleted = diff_manifest(manifest, [doc_path])
+
+    assert changed == {} and deleted == []
+    assert manifest[doc_path]['mtime'] == 3_000_000
+
+
+def test_entry_recorded_under_the_file_stem_is_re_ingested(tmp_path):
+    doc_path = _write(tmp_path / "report.pdf", "content")
+    manifest = {doc_path: {**_entry(doc_path), 'doc': "report"}}
+
+    changed, _ = diff_manifest(manifest, [doc_path])
+
+    assert changed[doc_path]['doc'] == "report.pdf"
@@ -0,0 +1,158 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# SQLite file holding the cache. Set to an empty string to disable caching.
+EMBEDDING_CACHE_PATH = os.getenv('EMBEDDING_CACHE_PATH', 'data/cache/embeddings.sqlite3')
+EMBEDDING_CACHE_MAX_MB = int(os.getenv('EMBEDDING_CACHE_MAX_MB', 1024))
+# Storage precision of cached vectors, float32 or float16.
+EMBEDDING_CACHE_DTYPE = os.getenv('EMBEDDING_CACHE_DTYPE', 'float32')
+
+# Share of max_bytes the cache is trimmed down to when it overflows.
+_EVICTION_TARGET = 0.9
+
+
+class EmbeddingCache:
+    """
+    Persistent, content-addressed cache of embedding vectors backed by SQLite.
+
+    Entries are keyed by (model name, dimension, text hash) and stored as compact
+    float32 or float16 blobs. When the stored vectors exceed max_bytes, the least
+    recently used entries are evicted.
+    """
+
+    def __init__(self, path: str, max_bytes: int, dtype: str = 'float32'):
+        """
+        Args:
+            path (str): Path of the SQLite database file.
+            max_bytes (int): Maximum total size of the stored vectors.
+            dtype (str, optional): Storage precision, 'float32' or 'float16'. Defaults to 'float32'.
+        """
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.dtype = np.dtype(dtype)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key BLOB PRIMARY KEY,
+                dtype TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL
+            ) WITHOUT ROWID
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used_idx ON embeddings (last_used)")
+        self._conn.commit()
+        self._size = self._conn.execute("SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings").fetchone()[0]
+
+    @staticmethod
+    def _key(model: str, dim: int, text: str) -> bytes:
+        return hashlib.sha256(f"{model}\0{dim}\0{text}".encode('utf-8')).digest()
+
+    def get_many(self, model: str, dim: int, texts: list) -> list:
+        """
+        Looks up the embeddings of many texts.
+
+        Args:
+            model (str): Name of the embedding model.
+            dim (int): Dimension the vectors were truncated to, or 0 for the model's own size.
+            texts (list[str]): The embedded texts.
+
+        Returns:
+            list[list[float]]: The cached vectors in the order of texts, None for misses.
+        """
+        keys = [self._key(model, dim, text) for text in texts]
+        found = {}
+        with self._lock:
+            # Stay well below SQLite's limit on bound parameters.
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, dtype, vector FROM embeddings WHERE key IN ({','.join('?' * len(batch))})",
+                    batch,
+                ).fetchall()
+                found.update((key, (dtype, vector)) for key, dtype, vector in rows)
+            if found:
+                now = time.time()
+                self._conn.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?",
+                                       [(now, key) for key in found])
+                self._conn.commit()
+
+        results = []
+        for key in keys:
+            entry = found.get(key)
+            if entry is None:
+                results.append(None)
+            else:
+                dtype, vector = entry
+                results.append(np.frombuffer(vector, dtype=dtype).astype(np.float32).tolist())
+        return results
+
+    def put_many(self, model: str, dim: int, texts: list, embeddings: list):
+        """
+        Stores the embeddings of many texts, skipping None entries, then evicts the
+        least recently used entries if the cache grew beyond max_bytes.
+        """
+        now = time.time()
+        rows = [
+            (self._key(model, dim, text), self.dtype.name, np.asarray(embedding, dtype=self.dtype).tobytes(), now)
+            for text, embedding in zip(texts, embeddings)
+            if embedding is not None
+        ]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)", rows)
+            self._conn.commit()
+            self._size += sum(len(row[2]) for row in rows)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        target = self.max_bytes * _EVICTION_TARGET
+        while self._size > target:
+            rows = self._conn.execute(
+                "SELECT key, LENGTH(vector) FROM embeddings ORDER BY last_used LIMIT 1000"
+            ).fetchall()
+            if not rows:
+                break
+            self._conn.executemany("DELETE FROM embeddings WHERE key = ?", [(key,) for key, _ in rows])
+            self._size -= sum(size for _, size in rows)
+        self._conn.commit()
+        # Recompute, since INSERT OR REPLACE of an existing key was counted twice.
+        self._size = self._conn.execute("SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache():
+    """
+    Returns the process-wide embedding cache configured from the environment.
+
+    Returns:
+        EmbeddingCache: The shared cache, or None if EMBEDDING_CACHE_PATH is empty.
+    """
+    global _cache
+    if not EMBEDDING_CACHE_PATH:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = EmbeddingCache(EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_MAX_MB * 1024 * 1024,
+                                        EMBEDDING_CACHE_DTYPE)
+    return _cache
@@ -0,0 +1,105 @@
+import os
+import threading
+from dotenv import load_dotenv
+from utils.token_utils import count_tokens
+
+load_dotenv()
+
+# Initial number of padded tokens sent per embedding request.
+EMBEDDING_TOKEN_BUDGET = int(os.getenv('EMBEDDING_TOKEN_BUDGET', 8192))
+# Request latency, in seconds, the token budget is steered towards.
+EMBEDDING_TARGET_LATENCY = float(os.getenv('EMBEDDING_TARGET_LATENCY', 2.0))
+
+# Largest step the budget takes after a single observation, in either direction.
+_MAX_STEP = 2.0
+# Weight of the newest observation in the budget's moving average.
+_SMOOTHING = 0.5
+
+
+def _bucket(tokens: int) -> int:
+    """
+    Returns the length bucket of an input: the next power of two of its token count.
+    """
+    return 1 << max(tokens - 1, 0).bit_length()
+
+
+class EmbeddingScheduler:
+    """
+    Groups embedding inputs into requests by token length.
+
+    Inputs are sorted into power-of-two length buckets and each request only holds
+    inputs from one bucket, so short table fragments are not padded up to the
+    longest paragraph. A request is filled until its padded size (inputs times the
+    bucket length) reaches the token budget. The budget adapts to the observed
+    latency of each request, growing while requests finish under target_latency
+    and shrinking when they run over.
+    """
+
+    def __init__(
+        self,
+        token_budget: int = EMBEDDING_TOKEN_BUDGET,
+        target_latency: float = EMBEDDING_TARGET_LATENCY,
+        min_budget: int = 512,
+        max_budget: int = 131072,
+        max_batch_size: int = 256,
+    ):
+        """
+        Args:
+            token_budget (int, optional): Initial padded tokens per request. Defaults to EMBEDDING_TOKEN_BUDGET.
+            target_latency (float, optional): Target seconds per request. Defaults to EMBEDDING_TARGET_LATENCY.
+            min_budget (int, optional): Lower bound of the budget. Defaults to 512.
+            max_budget (int, optional): Upper bound of the budget. Defaults to 131072.
+            max_batch_size (int, optional): Maximum number of inputs per request. Defaults to 256.
+        """
+        self.token_budget = token_budget
+        self.target_latency = target_latency
+        self.min_budget = min_budget
+        self.max_budget = max_budget
+        self.max_batch_size = max_batch_size
+        self._lock = threading.Lock()
+
+    def plan(self, texts: list, max_batch_size: int = None) -> list:
+        """
+        Splits inputs into requests.
+
+        Args:
+            texts (list[str]): The inputs to embed.
+            max_batch_size (int, optional): Maximum number of inputs per request for this call.
+                                            Defaults to the scheduler's max_batch_size.
+
+        Returns:
+            list[tuple[list[int], int]]: For each request, the indices of its inputs in texts
+                                         and its padded token count, to pass to record().
+        """
+        buckets = {}
+        for i, text in enumerate(texts):
+            buckets.setdefault(_bucket(count_tokens(text)), []).append(i)
+
+        budget = self.token_budget
+        max_batch_size = min(max_batch_size or self.max_batch_size, self.max_batch_size)
+        batches = []
+        for length, indices in sorted(buckets.items()):
+            per_batch = max(min(budget // length, max_batch_size), 1)
+            for start in range(0, len(indices), per_batch):
+                batch = indices[start:start + per_batch]
+                batches.append((batch, len(batch) * length))
+        return batches
+
+    def record(self, padded_tokens: int, latency: float):
+        """
+        Adjusts the token budget from the latency of a finished request.
+
+        Args:
+            padded_tokens (int): Padded token count of the request, as returned by plan().
+            latency (float): Seconds the request took.
+        """
+        if latency <= 0 or padded_tokens <= 0:
+            return
+        with self._lock:
+            if latency < self.target_latency and padded_tokens < self.token_budget / 2:
+                # A small request finishing quickly says nothing about the budget.
+                return
+            # Padded tokens that would have finished exactly on target, assuming linear cost.
+            scale = min(max(self.target_latency / latency, 1 / _MAX_STEP), _MAX_STEP)
+            budget = (1 - _SMOOTHING) * self.token_budget + _SMOOTHING * padded_tokens * scale
+            self.token_budget = int(min(max(budget, self.min_budget), self.max_budget))
@@ -0,0 +1,88 @@
+import math
+import os
+import re
+from dotenv import load_dotenv
+
+try:
+    from tokenizers import Tokenizer
+except ImportError:
+    Tokenizer = None
+
+load_dotenv()
+
+# Hugging Face tokenizer (hub name or tokenizer.json path) matching the embedding model,
+# e.g. "nomic-ai/nomic-embed-text-v1.5". Without it, token counts are estimated.
+EMBEDDING_TOKENIZER = os.getenv('EMBEDDING_TOKENIZER')
+# Context length of the embedding model. Longer inputs are silently truncated by Ollama.
+EMBEDDING_MAX_TOKENS = int(os.getenv('EMBEDDING_MAX_TOKENS', 2048))
+
+# Word pieces and single punctuation marks, the units a WordPiece/BPE tokenizer starts from.
+_PIECE_PATTERN = re.compile(r"\w+|[^\w\s]")
+# Upper bound on the characters covered by one estimated token inside a long word.
+_CHARS_PER_TOKEN = 6
+# Text is handed to the real tokenizer in windows of about this many characters.
+_WINDOW_CHARS = 100_000
+
+_tokenizer = None
+
+
+def _get_tokenizer():
+    global _tokenizer
+    if _tokenizer is None and EMBEDDING_TOKENIZER and Tokenizer is not None:
+        if os.path.isfile(EMBEDDING_TOKENIZER):
+            _tokenizer = Tokenizer.from_file(EMBEDDING_TOKENIZER)
+        else:
+            _tokenizer = Tokenizer.from_pretrained(EMBEDDING_TOKENIZER)
+    return _tokenizer
+
+
+def _iter_estimated_offsets(text: str):
+    for match in _PIECE_PATTERN.finditer(text):
+        start, end = match.span()
+        pieces = math.ceil((end - start) / _CHARS_PER_TOKEN)
+        step = math.ceil((end - start) / pieces)
+        for piece_start in range(start, end, step):
+            yield piece_start, min(piece_start + step, end)
+
+
+def _iter_tokenizer_offsets(tokenizer, text: str):
+    window_start = 0
+    while window_start < len(text):
+        window_end = min(window_start + _WINDOW_CHARS, len(text))
+        if window_end < len(text):
+            # Cut at whitespace so no word is split between two windows.
+            cut = text.rfind(" ", window_start, window_end)
+            if cut > window_start:
+                window_end = cut
+        encoding = tokenizer.encode(text[window_start:window_end], add_special_tokens=False)
+        for start, end in encoding.offsets:
+            if end > start:
+                yield window_start + start, window_start + end
+        window_start = window_end
+
+
+def iter_token_offsets(text: str):
+    """
+    Lazily yields the (start, end) character offsets of the embedding model's tokens.
+
+    Uses the tokenizer configured by EMBEDDING_TOKENIZER when the 'tokenizers' package is
+    installed. Otherwise tokens are estimated from words and punctuation, with long words
+    counted as several tokens, which errs on the side of overcounting.
+
+    Args:
+        text (str): The text to tokenize.
+
+    Yields:
+        tuple[int, int]: Character offsets of each token, in text order.
+    """
+    tokenizer = _get_tokenizer()
+    if tokenizer is not None:
+        return _iter_tokenizer_offsets(tokenizer, text)
+    return _iter_estimated_offsets(text)
+
+
+def count_tokens(text: str) -> int:
+    """
+    Returns the number of embedding model tokens in a text, see iter_token_offsets().
+    """
+    return sum(1 for _ in iter_token_offsets(text))